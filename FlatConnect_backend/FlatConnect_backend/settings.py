@@ -25,6 +25,118 @@ load_dotenv(os.path.join(BASE_DIR, '.env'))
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# LLM backend used by the issue agents (see issues/llm_backends.py).
+# For local runs without an API key use 'issues.llm_backends.FakeLLMBackend',
+# or 'issues.llm_backends.HTTPLLMBackend' with `manage.py run_fake_llm`.
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'issues.llm_backends.OpenAIBackend')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4')
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'http://127.0.0.1:8089')
+FAKE_LLM = {
+    'latency_ms': float(os.getenv('FAKE_LLM_LATENCY_MS', '300')),  # median
+    'latency_sigma': float(os.getenv('FAKE_LLM_LATENCY_SIGMA', '0.5')),  # log-normal spread
+    'error_rate': float(os.getenv('FAKE_LLM_ERROR_RATE', '0.0')),
+    'rate_limit_rate': float(os.getenv('FAKE_LLM_RATE_LIMIT_RATE', '0.0')),
+    'seed': int(os.getenv('FAKE_LLM_SEED', '0')),
+}
+
+# Local issue classifier (fast path in front of the categorization LLM call)
+# Retrain with: python manage.py train_issue_classifier
+ISSUE_CLASSIFIER_PATH = os.getenv('ISSUE_CLASSIFIER_PATH', str(BASE_DIR / 'ml_models' / 'issue_classifier.joblib'))
+ISSUE_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv('ISSUE_CLASSIFIER_MIN_CONFIDENCE', '0.85'))
+
+# In-memory category cache used by the agents; invalidated on IssueCategory
+# save/delete in the same process, expires after this many seconds elsewhere
+CATEGORY_REGISTRY_TTL = float(os.getenv('CATEGORY_REGISTRY_TTL', '300'))
+
+# Offline language detection; text detected as English at or above this
+# confidence skips the LLM translation call
+LANGUAGE_DETECTION_MIN_CONFIDENCE = float(os.getenv('LANGUAGE_DETECTION_MIN_CONFIDENCE', '0.8'))
+
+# LLM rate limiting, shared by every worker on the host through a SQLite file
+LLM_RATE_LIMIT_ENABLED = os.getenv('LLM_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+LLM_RATE_LIMIT_DB = os.getenv('LLM_RATE_LIMIT_DB', str(BASE_DIR / 'llm_ratelimit.sqlite3'))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '40000'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '1.0'))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '30.0'))  # seconds
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '20'))  # seconds
+
+# Descriptions are compacted to this many (estimated) tokens before they go
+# into agent prompts; the cost settings are used by benchmark_pipeline reports
+PROMPT_DESCRIPTION_MAX_TOKENS = int(os.getenv('PROMPT_DESCRIPTION_MAX_TOKENS', '300'))
+LLM_PROMPT_COST_PER_1K = float(os.getenv('LLM_PROMPT_COST_PER_1K', '0.03'))  # USD
+LLM_COMPLETION_COST_PER_1K = float(os.getenv('LLM_COMPLETION_COST_PER_1K', '0.06'))  # USD
+
+# LLM circuit breaker: open when at least LLM_BREAKER_MIN_CALLS calls in the
+# window fail at LLM_BREAKER_FAILURE_RATE, probe again after the open period
+LLM_BREAKER_FAILURE_RATE = float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5'))
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '5'))
+LLM_BREAKER_WINDOW = float(os.getenv('LLM_BREAKER_WINDOW', '60'))  # seconds
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))
+
+# AgentAction audit rows are buffered and written with bulk_create once this
+# many are pending or the oldest is this old (and at the end of each pipeline)
+AUDIT_BUFFER_SIZE = int(os.getenv('AUDIT_BUFFER_SIZE', '50'))
+AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '5'))
+
+# An active pipeline run blocks new triggers for its issue until it finishes
+# or goes this long without a stage starting (crashed worker, lost message)
+PIPELINE_RUN_LEASE_SECONDS = int(os.getenv('PIPELINE_RUN_LEASE_SECONDS', '600'))
+
+# Escalation (monitoring_agent): issues left in new/assigned/in_progress
+# longer than the SLA for their priority get bumped a level and secretaries
+# are notified; the scan runs every ESCALATION_SCAN_INTERVAL seconds
+ISSUE_SLA_HOURS = {
+    1: float(os.getenv('ISSUE_SLA_HOURS_LOW', '72')),
+    2: float(os.getenv('ISSUE_SLA_HOURS_MEDIUM', '48')),
+    3: float(os.getenv('ISSUE_SLA_HOURS_HIGH', '24')),
+    4: float(os.getenv('ISSUE_SLA_HOURS_CRITICAL', '4')),
+}
+ESCALATION_SCAN_INTERVAL = int(os.getenv('ESCALATION_SCAN_INTERVAL', '300'))
+ESCALATION_CHUNK_SIZE = int(os.getenv('ESCALATION_CHUNK_SIZE', '500'))
+
+# Uploaded images are re-encoded in the background (issues/images.py) into
+# WebP renditions, longest edge in pixels, without EXIF. Rendering uses a
+# process pool of IMAGE_PROCESS_WORKERS; daemonic processes (Celery prefork
+# children) cannot start one and use a thread pool instead, so run the
+# maintenance worker with `-P threads` to get real parallelism
+IMAGE_RENDITIONS = {'thumb': 320, 'medium': 1024, 'full': 2048}
+IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '80'))
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', str(os.cpu_count() or 2)))
+PROFILE_PICTURE_SIZE = int(os.getenv('PROFILE_PICTURE_SIZE', '512'))
+# Threads storing the files of one upload request in parallel
+IMAGE_UPLOAD_THREADS = int(os.getenv('IMAGE_UPLOAD_THREADS', '4'))
+
+# Photos of other issues in the same society created within the window whose
+# perceptual hashes differ in at most this many bits are linked as duplicates
+# (issues/phash.py; the band lookup supports up to 15, startup fails above)
+IMAGE_DUPLICATE_MAX_DISTANCE = int(os.getenv('IMAGE_DUPLICATE_MAX_DISTANCE', '10'))
+IMAGE_DUPLICATE_WINDOW_DAYS = int(os.getenv('IMAGE_DUPLICATE_WINDOW_DAYS', '30'))
+
+# Issue images are stored once per distinct content (issues/storage.py);
+# unreferenced files are deleted by a daily job after this grace period
+IMAGE_BLOB_GC_GRACE_SECONDS = int(os.getenv('IMAGE_BLOB_GC_GRACE_SECONDS', '3600'))
+
+# Resumable chunked uploads: parts are written to CHUNKED_UPLOAD_DIR and
+# unfinished uploads are deleted after CHUNKED_UPLOAD_TTL_HOURS
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'chunked_uploads'))
+CHUNKED_UPLOAD_MAX_BYTES = int(os.getenv('CHUNKED_UPLOAD_MAX_BYTES', str(50 * 1024 * 1024)))
+CHUNKED_UPLOAD_CHUNK_MAX_BYTES = int(os.getenv('CHUNKED_UPLOAD_CHUNK_MAX_BYTES', str(4 * 1024 * 1024)))
+CHUNKED_UPLOAD_TTL_HOURS = int(os.getenv('CHUNKED_UPLOAD_TTL_HOURS', '24'))
+
+# Media serving (issues/media.py). MEDIA_OFFLOAD hands the bytes to the web
+# server: 'x-accel' for nginx (an internal location at MEDIA_OFFLOAD_PREFIX
+# aliased to MEDIA_ROOT) or 'x-sendfile' for Apache/lighttpd; empty serves
+# from Django. Thumbnails (?size=N) are cached on disk, bounded in size.
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_OFFLOAD_PREFIX = os.getenv('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+MEDIA_CACHE_SECONDS = int(os.getenv('MEDIA_CACHE_SECONDS', '3600'))
+MEDIA_THUMBNAIL_SIZES = (96, 160, 320, 480, 640)
+MEDIA_THUMBNAIL_CACHE_DIR = os.getenv('MEDIA_THUMBNAIL_CACHE_DIR', str(BASE_DIR / 'thumbnail_cache'))
+MEDIA_THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('MEDIA_THUMBNAIL_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -67,18 +179,27 @@ INSTALLED_APPS = [
 SITE_ID = int(os.getenv('SITE_ID', '1'))
 
 REST_FRAMEWORK = {
+    # Token first: API clients send one, and it is served from a cache
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# CachedTokenAuthentication (accounts/authentication.py): tokens with user and
+# profile kept in a per-process LRU, and in the named Django cache when
+# TOKEN_AUTH_SHARED_CACHE is set. Deactivation and role changes reach other
+# processes' LRUs only when the TTL expires
+TOKEN_AUTH_CACHE_SIZE = int(os.getenv('TOKEN_AUTH_CACHE_SIZE', '10000'))
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', '30'))
+TOKEN_AUTH_SHARED_CACHE = os.getenv('TOKEN_AUTH_SHARED_CACHE', '')
+
+# One backend: a failed login costs one lookup and one password hash
+# (see accounts/backends.py and `python manage.py benchmark_login`)
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'allauth.account.auth_backends.AuthenticationBackend',
     'accounts.backends.EmailBackend',
 ]
 
@@ -135,7 +256,10 @@ GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', 'your-google-client-id')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET', 'your-google-client-secret')
 GOOGLE_REDIRECT_URI = os.getenv('GOOGLE_REDIRECT_URI', 'http://localhost:8000/api/auth/social/google/callback/')
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Console in development; set EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend
+# in tests, or point EMAIL_HOST/EMAIL_PORT at a local debugging SMTP server
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend' if DEBUG
+                          else 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
@@ -143,6 +267,14 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', 'your-email@gmail.com')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', 'your-app-password')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'FlatConnect <jeetsuchdevclg@gmail.com>')
 
+# Email outbox (accounts/outbox.py): batches share one SMTP connection; failed
+# emails are retried with exponential backoff and marked dead after the last attempt
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '100'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = float(os.getenv('EMAIL_OUTBOX_RETRY_BASE_SECONDS', '60'))
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = float(os.getenv('EMAIL_OUTBOX_RETRY_MAX_SECONDS', '3600'))
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv('EMAIL_OUTBOX_LEASE_SECONDS', '300'))
+
 # Social account providers (removed Google to avoid JWT dependency)
 SOCIALACCOUNT_PROVIDERS = {
     # Add other providers here if needed
@@ -194,6 +326,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transactions that read and then write (pipeline runs, checkpoints) take
+        # the write lock up front, so concurrent writers wait for it instead of
+        # failing with "database is locked" when upgrading a read lock
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -253,6 +392,44 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+
+# Task routing (see issues/routing.py): pipeline stages on 'agents' or, for
+# issues that look high/critical, 'agents_urgent'; notifications on
+# 'notifications'; monitoring, image analysis and backfills on 'maintenance'.
+# Run separate workers so no queue waits behind another, e.g.
+#   celery -A FlatConnect_backend worker -Q agents_urgent
+#   celery -A FlatConnect_backend worker -Q agents_urgent,agents
+#   celery -A FlatConnect_backend worker -Q notifications,celery
+#   celery -A FlatConnect_backend worker -Q maintenance --concurrency 2
+CELERY_TASK_ROUTES = ('issues.routing.route_task',)
+# Stages are long LLM calls; reserving more than one task per process only
+# makes queued work wait behind a busy process
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Periodic tasks, run with `celery -A FlatConnect_backend beat`
+CELERY_BEAT_SCHEDULE = {
+    'escalate-stale-issues': {
+        'task': 'issues.tasks.monitoring_agent',
+        'schedule': ESCALATION_SCAN_INTERVAL,
+        # A scan that waited a whole interval in the queue is superseded by the next one
+        'options': {'expires': ESCALATION_SCAN_INTERVAL},
+    },
+    'collect-image-blobs': {
+        'task': 'issues.tasks.collect_image_blobs',
+        'schedule': 24 * 60 * 60,
+    },
+    'expire-chunked-uploads': {
+        'task': 'issues.tasks.expire_chunked_uploads',
+        'schedule': 60 * 60,
+    },
+    # Retries and anything whose sender task was lost
+    'send-email-outbox': {
+        'task': 'accounts.tasks.send_email_outbox',
+        'schedule': 60,
+        'options': {'expires': 60},
+    },
+}
 
 # For development, use in-memory broker
 if DEBUG:
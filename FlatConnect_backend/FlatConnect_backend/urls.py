@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from issues.media import serve_media
 from dj_rest_auth.registration.views import ConfirmEmailView
 from rest_framework.authtoken.views import obtain_auth_token
 
@@ -28,8 +28,9 @@ urlpatterns = [
     
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
     path('issues/', include('issues.urls')),
-]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Metadata-free media only (renditions, processed avatars, thumbnails) with
+    # ETag/Range/cache headers; in production set MEDIA_OFFLOAD so the web
+    # server sends the bytes
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
+]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserProfile
+from .models import CustomUser, OutboxEmail, ResidentImport, UserProfile
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -40,5 +40,18 @@ class UserProfileAdmin(admin.ModelAdmin):
         }),
     )
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['to', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_at', 'last_error']
+
+class ResidentImportAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_by', 'status', 'rows', 'created', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'finished_at', 'errors', 'error']
+
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+admin.site.register(ResidentImport, ResidentImportAdmin)
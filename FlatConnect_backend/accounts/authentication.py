@@ -0,0 +1,189 @@
+"""Token authentication that does not query the database on every request.
+
+DRF's TokenAuthentication loads Token join User for each API request. This
+class keeps the token, with its user and the user's profile, in a bounded
+in-process LRU for TOKEN_AUTH_CACHE_TTL seconds and, if
+TOKEN_AUTH_SHARED_CACHE names a Django cache, there too so that processes
+share warm entries.
+
+Entries are pickled, so every request gets its own User instance and views
+cannot change an object another thread is using. The signals in
+accounts/signals.py drop a user's entry when their token is deleted or
+rotated, or their user or profile row is saved (deactivation, role change).
+That clears this process's LRU and the shared cache. Other processes' LRUs
+keep the old entry for at most the TTL, so keep it short.
+
+A request that read the token before a logout in this process must not
+cache its copy afterwards: every invalidation bumps a generation, and a
+load only stores its result if neither its key nor its user was
+invalidated since the load began.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+CACHE_KEY_PREFIX = 'token-auth:'
+
+
+class TokenCache:
+    """Thread-safe LRU of pickled tokens with a TTL, indexed by user for invalidation"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, user_id, pickled token)
+        self._keys_by_user = {}
+        # Generation of the last invalidation per key and per ('user', id), bounded like the entries
+        self._generation = 0
+        self._invalidated: OrderedDict = OrderedDict()
+        self._forgotten_generation = 0  # newest generation dropped from _invalidated
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Taken before a load, passed to set() to detect invalidations during it"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, user_id, data: bytes, generation: Optional[int] = None) -> bool:
+        """Store an entry; False (nothing stored) if it was invalidated after `generation`"""
+        with self._lock:
+            if generation is not None and self._invalidated_since(generation, key, user_id):
+                return False
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, user_id, data)
+            self._keys_by_user[user_id] = key
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def invalidated_since(self, generation: int, key: str, user_id) -> bool:
+        with self._lock:
+            return self._invalidated_since(generation, key, user_id)
+
+    def pop_user(self, user_id) -> Optional[str]:
+        """Drop the user's entry; returns its key if there was one"""
+        with self._lock:
+            self._mark(('user', user_id))
+            key = self._keys_by_user.get(user_id)
+            if key is not None:
+                self._remove(key)
+            return key
+
+    def pop(self, key: str):
+        with self._lock:
+            self._mark(key)
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._forgotten_generation = self._generation
+
+    def _mark(self, name):
+        self._generation += 1
+        self._invalidated[name] = self._generation
+        self._invalidated.move_to_end(name)
+        while len(self._invalidated) > self.max_entries:
+            _, generation = self._invalidated.popitem(last=False)
+            self._forgotten_generation = max(self._forgotten_generation, generation)
+
+    def _invalidated_since(self, generation: int, key: str, user_id) -> bool:
+        # A forgotten invalidation may have been this key's: assume the worst
+        return (self._forgotten_generation > generation
+                or self._invalidated.get(key, 0) > generation
+                or self._invalidated.get(('user', user_id), 0) > generation)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._keys_by_user.get(entry[1]) == key:
+            del self._keys_by_user[entry[1]]
+
+
+token_cache = TokenCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+
+
+def _cache_key(token_key: str) -> str:
+    # Raw tokens never end up in the shared cache's key space
+    return CACHE_KEY_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _shared_cache():
+    return caches[settings.TOKEN_AUTH_SHARED_CACHE] if settings.TOKEN_AUTH_SHARED_CACHE else None
+
+
+def invalidate_token(token_key: str):
+    key = _cache_key(token_key)
+    token_cache.pop(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(key)
+
+
+def invalidate_user(user_id):
+    """Drop the cached token of a user, locally and in the shared cache"""
+    key = token_cache.pop_user(user_id)
+    shared = _shared_cache()
+    if shared is None:
+        return
+    if key is None:
+        # Not cached in this process, but possibly in the shared cache
+        token_key = Token.objects.filter(user_id=user_id).values_list('key', flat=True).first()
+        key = _cache_key(token_key) if token_key else None
+    if key is not None:
+        shared.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with the token, user and profile cached (see module docstring)"""
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        data = token_cache.get(cache_key)
+        token = pickle.loads(data) if data is not None else self._load(key, cache_key)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+    def _load(self, key: str, cache_key: str) -> Token:
+        generation = token_cache.generation
+        shared = _shared_cache()
+        data = shared.get(cache_key) if shared is not None else None
+        if data is not None:
+            token = pickle.loads(data)
+        else:
+            try:
+                token = Token.objects.select_related('user', 'user__profile').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            data = pickle.dumps(token)
+            # A logout or role change while loading: use this copy once, cache nothing
+            if shared is not None and not token_cache.invalidated_since(generation, cache_key, token.user_id):
+                shared.set(cache_key, data, settings.TOKEN_AUTH_CACHE_TTL)
+        token_cache.set(cache_key, token.user_id, data, generation)
+        return token
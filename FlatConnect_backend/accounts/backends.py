@@ -1,26 +1,38 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 
 User = get_user_model()
 
 class EmailBackend(ModelBackend):
-    def authenticate(self, request, email=None, password=None, **kwargs):
+    """The only authentication backend: one lookup by email, one password check.
+
+    Django's ModelBackend, allauth's backend and this one used to be chained, so
+    a failed login looked the user up and hashed the password up to three
+    times. Login views, allauth and the admin all pass the email, as `email` or
+    as `username` (USERNAME_FIELD is email), so one backend covers them.
+    """
+
+    def authenticate(self, request, email=None, password=None, username=None, **kwargs):
+        email = email or username
         if email is None or password is None:
             return None
-        
+
         try:
-            # Try to fetch the user by email
-            user = User.objects.get(email=email)
+            # Profile and token joined in for the login response (accounts/login.py)
+            user = User._default_manager.select_related('profile', 'auth_token').get(email=email)
         except User.DoesNotExist:
+            # Hash anyway, so a missing account takes as long as a wrong password
+            User().set_password(password)
             return None
-        
+
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
-    
+
     def get_user(self, user_id):
+        # Session requests: profile joined in for role checks (accounts/permissions.py)
         try:
-            return User.objects.get(pk=user_id)
+            user = User._default_manager.select_related('profile').get(pk=user_id)
         except User.DoesNotExist:
-            return None 
\ No newline at end of file
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,98 @@
+"""What every login path returns: token, user and profile.
+
+custom_login, CustomLoginView and google_callback load the user with its
+profile and token in one joined query, and put the notification email in the
+outbox (accounts/outbox.py), so the SMTP handshake is never part of the
+login response time.
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .outbox import enqueue
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def load_login_user(user):
+    """The user with profile and token joined in (both may be missing)"""
+    # EmailBackend already joins them, so password logins need no second query
+    if all(User._meta.get_field(name).is_cached(user) for name in ('profile', 'auth_token')):
+        return user
+    return User.objects.select_related('profile', 'auth_token').get(pk=user.pk)
+
+
+def get_login_token(user) -> Token:
+    try:
+        return user.auth_token
+    except ObjectDoesNotExist:
+        # First login only
+        token, _ = Token.objects.get_or_create(user=user)
+        return token
+
+
+def user_data(user) -> dict:
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser
+    }
+
+
+def profile_data(user) -> dict:
+    try:
+        profile = user.profile
+    except ObjectDoesNotExist:
+        return {
+            'role': None,
+            'flat_number': None,
+            'building_block': None,
+            'is_verified': False,
+            'has_profile': False
+        }
+    return {
+        'id': profile.id,
+        'role': profile.role or None,  # Handle None role
+        'flat_number': profile.flat_number,
+        'building_block': profile.building_block,
+        'is_verified': profile.is_verified,
+        'has_profile': True
+    }
+
+
+def login_payload(user, token: Token) -> dict:
+    return {'key': token.key, 'user': user_data(user), 'profile': profile_data(user)}
+
+
+def queue_login_notification(user):
+    """Put the login notification email in the outbox (sent by a worker)"""
+    login_time = timezone.now()
+    message = f"""
+    Hello {user.first_name or user.username}!
+    
+    You have successfully logged into your FlatConnect account.
+    
+    Login Details:
+    - Username: {user.username}
+    - Email: {user.email}
+    - Time: {login_time}
+    
+    If this wasn't you, please contact support immediately.
+    
+    Best regards,
+    The FlatConnect Team
+    """
+    try:
+        enqueue('login', user.email, 'Login Notification - FlatConnect', message)
+    except Exception as e:
+        # A failed insert must not fail the login
+        logger.error(f"Could not queue login notification for user {user.id}: {e}")
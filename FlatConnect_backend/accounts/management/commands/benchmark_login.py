@@ -0,0 +1,72 @@
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from issues.stats import percentile
+
+User = get_user_model()
+
+BENCHMARK_DOMAIN = "login-benchmark.flatconnect.local"
+PASSWORD = "correct horse battery staple"
+# The backend chain before accounts.backends.EmailBackend became the only one
+CHAINED_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend',
+    'accounts.backends.EmailBackend',
+]
+SINGLE_BACKEND = ['accounts.backends.EmailBackend']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare authenticate() throughput and queries of the old three-backend chain with the "
+        "single email backend, for valid logins, wrong passwords and unknown emails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--attempts', type=int, default=30, help="Attempts per case and configuration")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['attempts'] < 1:
+            raise CommandError("--users and --attempts must be positive")
+
+        # bulk_create: no welcome email signal, and the password is hashed once
+        password = make_password(PASSWORD)
+        emails = [f"user{i}@{BENCHMARK_DOMAIN}" for i in range(options['users'])]
+        User.objects.bulk_create([User(email=email, username=email, password=password) for email in emails])
+        request = RequestFactory().post('/api/auth/login/')
+
+        cases = {
+            'valid': lambda i: (emails[i % len(emails)], PASSWORD),
+            'wrong password': lambda i: (emails[i % len(emails)], PASSWORD + "!"),
+            'unknown email': lambda i: (f"nobody{i}@{BENCHMARK_DOMAIN}", PASSWORD),
+        }
+        try:
+            for label, backends in (("chained backends", CHAINED_BACKENDS), ("single backend", SINGLE_BACKEND)):
+                self.stdout.write(f"{label}:")
+                with override_settings(AUTHENTICATION_BACKENDS=backends):
+                    for case, credentials in cases.items():
+                        self._measure(case, credentials, request, options['attempts'])
+        finally:
+            User.objects.filter(email__endswith=f"@{BENCHMARK_DOMAIN}").delete()
+
+    def _measure(self, case, credentials, request, attempts):
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for i in range(attempts):
+                email, password = credentials(i)
+                attempt_start = time.perf_counter()
+                authenticate(request, email=email, password=password)
+                timings.append((time.perf_counter() - attempt_start) * 1000)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  {case:<15} {attempts / elapsed:7.1f} logins/s  p50={percentile(timings, 50):7.1f}ms "
+            f"p95={percentile(timings, 95):7.1f}ms  queries/attempt={len(queries) / attempts:.1f}"
+        )
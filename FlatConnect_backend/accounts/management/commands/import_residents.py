@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.onboarding import import_residents
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users and profiles from a CSV (email, first_name, last_name, flat_number, building_block, "
+        "role, phone_number, password) in bulk, and queue their welcome emails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Password hashing processes (default: CPUs)")
+        parser.add_argument('--no-welcome-email', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        def progress(rows, created, seconds):
+            self.stdout.write(f"  {rows} rows, {created} created, {rows / seconds if seconds else 0:.1f} rows/s")
+
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                report = import_residents(f, chunk_size=options['chunk_size'], workers=options['workers'], processes=True,
+                                          send_welcome=not options['no_welcome_email'], progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']} ({error['email'] or 'no email'}): {error['error']}")
+        self.stdout.write(
+            f"Imported {report['created']}/{report['rows']} rows in {report['seconds']:.2f}s "
+            f"({report['rows_per_second']:.1f} rows/s), {len(report['errors'])} errors"
+        )
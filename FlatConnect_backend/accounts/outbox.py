@@ -0,0 +1,131 @@
+"""Email outbox: mail is stored first and sent in batches by a worker.
+
+Welcome and login emails used to open their own SMTP connection inside the
+request or signal, so onboarding a block of residents opened hundreds of TLS
+sessions. Now enqueue() only inserts an OutboxEmail row and, once the
+transaction commits, queues send_email_outbox. send_batch() claims due rows
+with SKIP LOCKED, so concurrent senders never share a row, and sends the
+whole batch over one connection from get_connection() (any EMAIL_BACKEND:
+SMTP, locmem in tests, console in development).
+
+A failed email is retried after an exponential backoff with full jitter.
+After EMAIL_OUTBOX_MAX_ATTEMPTS tries it is marked dead and kept for
+inspection in the admin. Rows a crashed sender left in 'sending' are
+claimed again once EMAIL_OUTBOX_LEASE_SECONDS have passed.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from issues.ratelimit import full_jitter_delay
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(kind: str, to: str, subject: str, body: str) -> OutboxEmail:
+    email = OutboxEmail.objects.create(kind=kind, to=to, subject=subject, body=body)
+    transaction.on_commit(_queue_sender)
+    return email
+
+
+def enqueue_many(kind: str, messages: Iterable[Tuple[str, str, str]]) -> List[OutboxEmail]:
+    """(to, subject, body) per email; one insert and one sender task for all of them"""
+    emails = OutboxEmail.objects.bulk_create(
+        [OutboxEmail(kind=kind, to=to, subject=subject, body=body) for to, subject, body in messages]
+    )
+    if emails:
+        transaction.on_commit(_queue_sender)
+    return emails
+
+
+def _queue_sender():
+    # Imported here: the tasks module imports the issues app's image helpers
+    from .tasks import send_email_outbox
+    try:
+        send_email_outbox.delay()
+    except Exception as e:
+        # The beat schedule picks the emails up later
+        logger.error(f"Could not queue the email outbox sender: {e}")
+
+
+def _claim(batch_size: int) -> List[OutboxEmail]:
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale))
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(status='sending', claimed_at=now)
+    return emails
+
+
+def _failed(email: OutboxEmail, error: Exception, now):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'dead'
+        logger.error(f"Giving up on {email.kind} email {email.id} to {email.to}: {error}")
+    else:
+        email.status = 'pending'
+        delay = full_jitter_delay(email.attempts, settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+                                  settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS)
+        email.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def send_batch(batch_size: int = None) -> Dict[str, int]:
+    """Send up to batch_size due emails over one connection"""
+    emails = _claim(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    stats = {'sent': 0, 'retry': 0, 'dead': 0}
+    if not emails:
+        return stats
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can be sent: every email counts a failed attempt
+        now = timezone.now()
+        for email in emails:
+            _failed(email, e, now)
+    else:
+        try:
+            for email in emails:
+                try:
+                    EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to],
+                                 connection=connection).send()
+                    email.status = 'sent'
+                    email.sent_at = timezone.now()
+                except Exception as e:
+                    _failed(email, e, timezone.now())
+        finally:
+            connection.close()
+
+    for email in emails:
+        email.claimed_at = None
+        stats['retry' if email.status == 'pending' else email.status] += 1
+    OutboxEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'next_attempt_at', 'claimed_at', 'last_error', 'sent_at']
+    )
+    return stats
+
+
+def drain(max_batches: int = 50) -> Dict[str, int]:
+    """Send batches until nothing is due (or max_batches were sent)"""
+    totals = {'sent': 0, 'retry': 0, 'dead': 0}
+    for _ in range(max_batches):
+        stats = send_batch()
+        for key, value in stats.items():
+            totals[key] += value
+        if not any(stats.values()):
+            break
+    return totals
@@ -0,0 +1,70 @@
+"""Role-based DRF permissions.
+
+The role comes from the user's profile. get_profile loads it once per
+request and memoizes it on the request. Usually it costs no query: token
+users come with their profile (accounts/authentication.py), and session
+users are loaded with it (EmailBackend.get_user).
+"""
+from typing import Optional
+
+from django.core.exceptions import ObjectDoesNotExist
+from rest_framework.permissions import BasePermission
+
+from .models import UserProfile
+
+MANAGER_ROLES = ('admin', 'secretary')
+WORKER_ROLES = ('worker', 'admin')
+
+_NOT_LOADED = object()
+
+
+def get_profile(request) -> Optional[UserProfile]:
+    """The profile of request.user, or None; loaded at most once per request"""
+    profile = getattr(request, '_profile', _NOT_LOADED)
+    if profile is not _NOT_LOADED:
+        return profile
+    user = request.user
+    if not (user and user.is_authenticated):
+        profile = None
+    elif user._meta.get_field('profile').is_cached(user):
+        try:
+            profile = user.profile
+        except ObjectDoesNotExist:
+            profile = None
+    else:
+        profile = UserProfile.objects.filter(user_id=user.pk).first()
+    request._profile = profile
+    return profile
+
+
+def get_role(request) -> Optional[str]:
+    profile = get_profile(request)
+    return profile.role if profile else None
+
+
+class HasRole(BasePermission):
+    """Authenticated users whose profile role is in `roles` (staff and superusers too if `allow_staff`)"""
+    roles = ()
+    allow_staff = False
+    message = {'error': 'You do not have permission to perform this action'}
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        if self.allow_staff and (user.is_superuser or user.is_staff):
+            return True
+        return get_role(request) in self.roles
+
+
+class IsManager(HasRole):
+    """Admins, secretaries, staff and superusers"""
+    roles = MANAGER_ROLES
+    allow_staff = True
+    message = {'error': 'Only admins and secretaries can access this endpoint'}
+
+
+class IsWorker(HasRole):
+    """Workers and admins"""
+    roles = WORKER_ROLES
+    message = {'error': 'Only workers can access this endpoint'}
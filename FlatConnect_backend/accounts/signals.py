@@ -1,42 +1,59 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user
+from .models import UserProfile
+from .outbox import enqueue
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=User)
 def send_welcome_email(sender, instance, created, **kwargs):
-    """Send welcome email when a new user is created"""
-    if created and not settings.DEBUG:  # Only send real emails in production
-        subject = 'Welcome to FlatConnect!'
-        message = f"""
-        Hello {instance.first_name or instance.username}!
-        
-        Welcome to FlatConnect! Your account has been successfully created.
-        
-        You can now:
-        - Log in to your account
-        - Complete your profile
-        - Report issues in your society
-        
-        Best regards,
-        The FlatConnect Team
-        """
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[instance.email],
-                fail_silently=True,  # Don't fail if email doesn't send
-            )
-        except Exception as e:
-            # Log the error but don't break the registration
-            print(f"Failed to send welcome email to {instance.email}: {e}")
+    """Put a welcome email in the outbox when a new user is created"""
+    if not created:
+        return
+    message = f"""
+    Hello {instance.first_name or instance.username}!
+    
+    Welcome to FlatConnect! Your account has been successfully created.
+    
+    You can now:
+    - Log in to your account
+    - Complete your profile
+    - Report issues in your society
     
-    elif created and settings.DEBUG:
-        # In development, just print to console
-        print(f"Welcome email would be sent to {instance.email} in production") 
\ No newline at end of file
+    Best regards,
+    The FlatConnect Team
+    """
+    try:
+        # Savepoint: a failed insert must not break the caller's transaction
+        with transaction.atomic():
+            enqueue('welcome', instance.email, 'Welcome to FlatConnect!', message)
+    except Exception as e:
+        # Log the error but don't break the registration
+        logger.error(f"Failed to queue welcome email to {instance.email}: {e}")
+
+
+# ✅ Keep CachedTokenAuthentication in step with logout, token rotation,
+# deactivation and role changes (see accounts/authentication.py)
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_token(sender, instance, update_fields=None, **kwargs):
+    # Logins only save last_login, which authentication does not use
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_token(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -0,0 +1,70 @@
+import io
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from issues.images import read_file, render
+from django.utils import timezone
+from .models import ResidentImport, UserProfile
+from .onboarding import import_residents
+from .outbox import drain
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_profile_picture(profile_id: int):
+    """Replace an uploaded profile picture with a small WebP without EXIF/GPS"""
+    profile = UserProfile.objects.filter(id=profile_id).first()
+    if not profile or not profile.profile_picture:
+        return "No profile picture"
+
+    original = profile.profile_picture.name
+    result = render(read_file(profile.profile_picture), {'avatar': settings.PROFILE_PICTURE_SIZE},
+                    settings.IMAGE_WEBP_QUALITY)
+    name = default_storage.save(f"profile_pictures/{profile.user_id}.webp", ContentFile(result['renditions']['avatar']))
+
+    # Only swap if the user has not uploaded another picture in the meantime
+    if UserProfile.objects.filter(id=profile_id, profile_picture=original).update(profile_picture=name):
+        default_storage.delete(original)
+    else:
+        default_storage.delete(name)
+    return "Profile picture processed"
+
+
+@shared_task
+def send_email_outbox():
+    """Send due outbox emails in batches over one connection each (see accounts/outbox.py)"""
+    return drain()
+
+
+@shared_task
+def import_residents_csv(import_id: str):
+    """Run an uploaded resident CSV (see accounts/onboarding.py), recording progress on the ResidentImport"""
+    job = ResidentImport.objects.filter(id=import_id, status='queued').first()
+    if not job:
+        return "Import not queued"
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    def progress(rows, created, seconds):
+        ResidentImport.objects.filter(id=job.id).update(rows=rows, created=created)
+
+    try:
+        with job.file.open('rb') as f:
+            report = import_residents(io.TextIOWrapper(f, encoding='utf-8-sig', newline=''),
+                                      send_welcome=job.send_welcome, progress=progress)
+    except Exception as e:
+        logger.error(f"Resident import {job.id} failed: {e}")
+        job.status, job.error = 'failed', str(e)
+    else:
+        job.status = 'complete'
+        job.rows, job.created, job.errors = report['rows'], report['created'], report['errors']
+    finally:
+        # The file can hold passwords; the report is all that is kept
+        job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save()
+    return f"{job.created}/{job.rows} residents imported"
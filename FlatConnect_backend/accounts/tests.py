@@ -1,3 +1,305 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import token_cache
+from .models import OutboxEmail, ResidentImport, UserProfile
+from .onboarding import import_residents
+from .outbox import drain, enqueue, send_batch
+from .permissions import IsManager, IsWorker, get_profile
+from .tasks import import_residents_csv
+
+User = get_user_model()
+
+LOCMEM_EMAIL = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+def create_user(email, role='member', **extra):
+    """A user with the given profile role, reloaded so the profile is not stale"""
+    user = User.objects.create_user(email=email, password='pass12345', **extra)
+    UserProfile.objects.filter(user=user).update(role=role)
+    return User.objects.select_related('profile').get(id=user.id)
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_EMAIL, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(TestCase):
+    """Batched sending with retries, and dead-lettering after EMAIL_OUTBOX_MAX_ATTEMPTS"""
+
+    def test_new_user_gets_welcome_email(self):
+        User.objects.create_user(email='new@example.com', password='pass12345')
+        self.assertEqual(drain(), {'sent': 1, 'retry': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        self.assertEqual(OutboxEmail.objects.get().status, 'sent')
+
+    def test_failed_send_is_retried_then_dead(self):
+        email = enqueue('login', 'someone@example.com', 'Login', 'You logged in')
+        with mock.patch('accounts.outbox.EmailMessage.send', side_effect=SMTPException("mailbox full")):
+            self.assertEqual(send_batch(), {'sent': 0, 'retry': 1, 'dead': 0})
+            email.refresh_from_db()
+            self.assertEqual(email.status, 'pending')
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now() - timedelta(seconds=1))
+            self.assertIn("mailbox full", email.last_error)
+
+            # Not due yet: the backoff keeps it out of the next batch
+            OutboxEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+            self.assertEqual(send_batch(), {'sent': 0, 'retry': 0, 'dead': 0})
+
+            OutboxEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(send_batch(), {'sent': 0, 'retry': 0, 'dead': 1})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'dead')
+        self.assertEqual(drain(), {'sent': 0, 'retry': 0, 'dead': 0})
+        self.assertEqual(mail.outbox, [])
+
+    def test_stale_claim_is_sent_again(self):
+        email = enqueue('login', 'someone@example.com', 'Login', 'You logged in')
+        OutboxEmail.objects.filter(id=email.id).update(status='sending', claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(send_batch(), {'sent': 1, 'retry': 0, 'dead': 0})
+
+    def test_failed_welcome_insert_keeps_registration_transaction(self):
+        def broken_insert(kind, to, subject, body):
+            OutboxEmail.objects.create(kind=kind, to=to, subject=subject, body=body, status=None)
+
+        with mock.patch('accounts.signals.enqueue', side_effect=broken_insert):
+            with transaction.atomic():
+                user = User.objects.create_user(email='new@example.com', password='pass12345')
+                # Without the savepoint this query fails: the transaction would be broken
+                self.assertTrue(User.objects.filter(id=user.id).exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+RESIDENTS_CSV = """email,first_name,flat_number,role,password
+a@example.com,Asha,A-101,member,
+not-an-email,Bad,A-102,member,
+b@example.com,Bina,A-103,landlord,
+a@example.com,Again,A-104,member,
+existing@example.com,Old,A-105,member,
+c@example.com,Chetan,A-106,secretary,secret123
+"""
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_EMAIL)
+class ImportResidentsTests(TestCase):
+    """CSV onboarding: valid rows are created, every bad row is reported with its line"""
+
+    def setUp(self):
+        User.objects.create_user(email='existing@example.com', password='pass12345')
+        OutboxEmail.objects.all().delete()
+
+    def test_error_rows(self):
+        report = import_residents(StringIO(RESIDENTS_CSV), chunk_size=2)
+
+        self.assertEqual(report['rows'], 6)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual([(error['line'], error['email']) for error in report['errors']], [
+            (3, 'not-an-email'),
+            (4, 'b@example.com'),
+            (5, 'a@example.com'),
+            (6, 'existing@example.com'),
+        ])
+        self.assertIn("role must be one of", report['errors'][1]['error'])
+        self.assertIn("duplicate email", report['errors'][2]['error'])
+        self.assertIn("already exists", report['errors'][3]['error'])
+
+        asha = User.objects.select_related('profile').get(email='a@example.com')
+        self.assertEqual(asha.profile.flat_number, 'A-101')
+        self.assertFalse(asha.has_usable_password())
+        self.assertTrue(User.objects.get(email='c@example.com').check_password('secret123'))
+        self.assertEqual(OutboxEmail.objects.filter(kind='welcome').count(), 2)
+
+    def test_missing_email_column(self):
+        with self.assertRaises(ValueError):
+            import_residents(StringIO("name,flat_number\nAsha,A-101\n"))
+
+    def test_api_queues_import_and_reports_it(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        client = APIClient()
+        client.force_authenticate(create_user('secretary@example.com', role='secretary'))
+        upload = SimpleUploadedFile('residents.csv', RESIDENTS_CSV.encode(), content_type='text/csv')
+
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(import_residents_csv, 'delay', side_effect=import_residents_csv.run):
+            response = client.post(reverse('import_residents'), {'file': upload, 'send_welcome_email': 'false'},
+                                   format='multipart')
+        self.assertEqual(response.status_code, 202)
+
+        response = client.get(reverse('resident_import_status', args=[response.data['import_id']]))
+        self.assertEqual(response.data['status'], 'complete')
+        self.assertEqual((response.data['rows'], response.data['created']), (6, 2))
+        self.assertEqual(len(response.data['errors']), 4)
+        self.assertFalse(ResidentImport.objects.get().file)
+        self.assertFalse(OutboxEmail.objects.filter(to__in=['a@example.com', 'c@example.com']).exists())
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Cached tokens skip the token query until logout, deactivation or a role change drops them"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = create_user('resident@example.com')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_profile(self):
+        return self.client.get(reverse('user_profile'))
+
+    def test_second_request_is_served_from_cache(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_profile().status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_role_change_applies_immediately(self):
+        url = reverse('resident_import_status', args=['00000000-0000-0000-0000-000000000000'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = 'secretary'
+        profile.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def load_racing(self, invalidate):
+        """Patch the token query so `invalidate` runs after the row is read, before it is cached"""
+        select_related = Token.objects.select_related
+
+        def racing(*fields):
+            token = select_related(*fields).get(key=self.token.key)
+            invalidate()
+            queryset = mock.Mock()
+            queryset.get.return_value = token
+            return queryset
+
+        return mock.patch.object(Token.objects, 'select_related', side_effect=racing)
+
+    def test_logout_during_load_is_not_cached(self):
+        with self.load_racing(lambda: Token.objects.get(key=self.token.key).delete()):
+            # This request read the token before the logout: it may still pass
+            self.assertEqual(self.get_profile().status_code, 200)
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_role_change_during_load_is_not_cached(self):
+        url = reverse('resident_import_status', args=['00000000-0000-0000-0000-000000000000'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        token_cache.clear()
+
+        def promote():
+            profile = UserProfile.objects.get(user=self.user)
+            profile.role = 'secretary'
+            profile.save()
+
+        with self.load_racing(promote):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class RolePermissionTests(TestCase):
+    """IsManager and IsWorker by profile role; the profile is loaded once per request"""
+
+    def request_for(self, user):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        return request
+
+    def allowed(self, permission, user):
+        return permission().has_permission(self.request_for(user), None)
+
+    def test_roles(self):
+        expected = {
+            'member': (False, False),
+            'worker': (False, True),
+            'secretary': (True, False),
+            'admin': (True, True),
+        }
+        for role, (manager, worker) in expected.items():
+            user = User.objects.get(id=create_user(f'{role}@example.com', role=role).id)
+            self.assertEqual(self.allowed(IsManager, user), manager, role)
+            self.assertEqual(self.allowed(IsWorker, user), worker, role)
+
+    def test_staff_are_managers_but_not_workers(self):
+        staff = create_user('staff@example.com', is_staff=True)
+        self.assertTrue(self.allowed(IsManager, staff))
+        self.assertFalse(self.allowed(IsWorker, staff))
+
+    def test_anonymous_and_profileless_users_are_denied(self):
+        self.assertFalse(self.allowed(IsManager, AnonymousUser()))
+        user = create_user('noprofile@example.com')
+        UserProfile.objects.filter(user=user).delete()
+        self.assertFalse(self.allowed(IsManager, User.objects.get(id=user.id)))
+
+    def test_profile_is_loaded_once_per_request(self):
+        user = User.objects.get(id=create_user('secretary@example.com', role='secretary').id)
+        request = self.request_for(user)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsManager().has_permission(request, None))
+            self.assertFalse(IsWorker().has_permission(request, None))
+            self.assertEqual(get_profile(request).role, 'secretary')
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_EMAIL)
+class GoogleCallbackTests(TestCase):
+    """The session a Google login creates must authenticate later requests (EmailBackend.get_user)"""
+
+    def login_with_google(self, email):
+        session = self.client.session
+        session['oauth_state'] = 'state'
+        session.save()
+        with mock.patch('accounts.views.OAuth2Session') as oauth:
+            oauth.return_value.get.return_value.json.return_value = {
+                'email': email, 'given_name': 'Asha', 'family_name': 'Rao',
+            }
+            return self.client.get(reverse('google_callback'), {'code': 'code', 'state': 'state'})
+
+    def test_new_user_session_roundtrip(self):
+        response = self.login_with_google('google@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'google@example.com')
+        self.assertEqual(self.client.session['_auth_user_backend'], 'accounts.backends.EmailBackend')
+
+        response = self.client.get(reverse('user_profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(email='google@example.com').first_name, 'Asha')
+
+    def test_existing_user_session_roundtrip(self):
+        create_user('google@example.com')
+        self.assertEqual(self.login_with_google('google@example.com').status_code, 200)
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 200)
+        self.assertEqual(User.objects.filter(email='google@example.com').count(), 1)
+
+    def test_wrong_state_is_rejected(self):
+        session = self.client.session
+        session['oauth_state'] = 'state'
+        session.save()
+        response = self.client.get(reverse('google_callback'), {'code': 'code', 'state': 'forged'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('_auth_user_id', self.client.session)
@@ -9,4 +9,6 @@ urlpatterns = [
     path('profile/', views.user_profile, name='user_profile'),
     path('profile/exists/', views.profile_exists, name='profile_exists'),
     path('test-registration/', views.test_registration, name='test_registration'),
+    path('import-residents/', views.import_residents, name='import_residents'),
+    path('import-residents/<uuid:import_id>/', views.resident_import_status, name='resident_import_status'),
 ]
\ No newline at end of file
@@ -1,108 +1,59 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.http import JsonResponse
 from django.contrib.auth import login, get_user_model, authenticate
 from django.conf import settings
 from django.urls import reverse
-from django.core.mail import send_mail
+from django.utils import timezone
 from requests_oauthlib import OAuth2Session
 import json
+import logging
 import os # Added for OAUTHLIB_INSECURE_TRANSPORT
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
+from dj_rest_auth.app_settings import api_settings
 from dj_rest_auth.views import LoginView
-from .models import UserProfile
+from .login import get_login_token, load_login_user, login_payload, profile_data, queue_login_notification, user_data
+from .models import ResidentImport, UserProfile
+from .permissions import IsManager, get_profile
 from .serializers import UserProfileSerializer
+from .tasks import import_residents_csv, process_profile_picture
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 GOOGLE_CLIENT_ID = settings.GOOGLE_CLIENT_ID
 GOOGLE_CLIENT_SECRET = settings.GOOGLE_CLIENT_SECRET
 GOOGLE_REDIRECT_URI = settings.GOOGLE_REDIRECT_URI
 
 def send_login_notification(user):
-    """Send login notification email"""
-    if settings.DEBUG:
-        # In development, just print to console
-        print(f"Login notification would be sent to {user.email} in production")
-        return
-    
-    subject = 'Login Notification - FlatConnect'
-    message = f"""
-    Hello {user.first_name or user.username}!
-    
-    You have successfully logged into your FlatConnect account.
-    
-    Login Details:
-    - Username: {user.username}
-    - Email: {user.email}
-    - Time: {user.last_login}
-    
-    If this wasn't you, please contact support immediately.
-    
-    Best regards,
-    The FlatConnect Team
-    """
-    
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=True,
-        )
-    except Exception as e:
-        print(f"Failed to send login notification to {user.email}: {e}")
+    """Queue the login notification email; SMTP stays out of the request"""
+    queue_login_notification(user)
 
 class CustomLoginView(LoginView):
     """Custom login view that includes user profile information"""
-    
+
+    def login(self):
+        """Load profile and token with the user in one joined query"""
+        self.user = load_login_user(self.serializer.validated_data['user'])
+        self.token = get_login_token(self.user)
+        if api_settings.SESSION_LOGIN:
+            self.process_login()
+
     def get_response(self):
         """Override to include profile information in response"""
         response = super().get_response()
-        
-        # Get user from the token
-        user = self.user
-        
-        # Get user profile information
-        try:
-            profile = UserProfile.objects.get(user=user)
-            profile_data = {
-                'id': profile.id,
-                'role': profile.role,
-                'flat_number': profile.flat_number,
-                'building_block': profile.building_block,
-                'is_verified': profile.is_verified,
-                'has_profile': True
-            }
-        except UserProfile.DoesNotExist:
-            profile_data = {
-                'role': None,
-                'flat_number': None,
-                'building_block': None,
-                'is_verified': False,
-                'has_profile': False
-            }
-        
-        # Add user and profile data to response
-        response.data['user'] = {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'is_staff': user.is_staff,
-            'is_superuser': user.is_superuser
-        }
-        response.data['profile'] = profile_data
-        
+
+        # Add user and profile data to response (already loaded by login())
+        response.data['user'] = user_data(self.user)
+        response.data['profile'] = profile_data(self.user)
+
         # Send login notification
-        send_login_notification(user)
-        
+        send_login_notification(self.user)
+
         return response
 
 @api_view(['POST'])
@@ -124,45 +75,14 @@ def custom_login(request):
             'error': 'Invalid credentials'
         }, status=status.HTTP_401_UNAUTHORIZED)
     
-    # Get or create token
-    token, created = Token.objects.get_or_create(user=user)
-    
-    # Get user profile information
-    try:
-        profile = UserProfile.objects.get(user=user)
-        profile_data = {
-            'id': profile.id,
-            'role': profile.role or None,  # Handle None role
-            'flat_number': profile.flat_number,
-            'building_block': profile.building_block,
-            'is_verified': profile.is_verified,
-            'has_profile': True
-        }
-    except UserProfile.DoesNotExist:
-        profile_data = {
-            'role': None,
-            'flat_number': None,
-            'building_block': None,
-            'is_verified': False,
-            'has_profile': False
-        }
-    
+    # ✅ Profile and token in one joined query
+    user = load_login_user(user)
+    token = get_login_token(user)
+
     # Send login notification
     send_login_notification(user)
-    
-    return Response({
-        'key': token.key,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'is_staff': user.is_staff,
-            'is_superuser': user.is_superuser
-        },
-        'profile': profile_data
-    })
+
+    return Response(login_payload(user, token))
 
 def google_login(request):
     """Initiate Google OAuth flow"""
@@ -208,55 +128,25 @@ def google_callback(request):
         email = user_info.get('email')
         if not email:
             return JsonResponse({'error': 'Email not provided by Google'}, status=400)
-        user, created = User.objects.get_or_create(
-            email=email,
-            defaults={
-                'username': user_info.get('email', email),
-                'first_name': user_info.get('given_name', ''),
-                'last_name': user_info.get('family_name', ''),
-            }
-        )
-        login(request, user, backend='django.contrib.auth.backends.ModelBackend') # Specify backend
-        
+        # ✅ Profile and token joined in; new users are created once and reloaded
+        user = User.objects.select_related('profile', 'auth_token').filter(email=email).first()
+        if user is None:
+            user, created = User.objects.get_or_create(
+                email=email,
+                defaults={
+                    'username': user_info.get('email', email),
+                    'first_name': user_info.get('given_name', ''),
+                    'last_name': user_info.get('family_name', ''),
+                }
+            )
+            user = load_login_user(user)
+        login(request, user, backend='accounts.backends.EmailBackend') # Specify backend
+
         # Send login notification
         send_login_notification(user)
-        
-        from rest_framework.authtoken.models import Token
-        token, created = Token.objects.get_or_create(user=user)
-        
-        # Get user profile information for Google login too
-        try:
-            profile = UserProfile.objects.get(user=user)
-            profile_data = {
-                'id': profile.id,
-                'role': profile.role,
-                'flat_number': profile.flat_number,
-                'building_block': profile.building_block,
-                'is_verified': profile.is_verified,
-                'has_profile': True
-            }
-        except UserProfile.DoesNotExist:
-            profile_data = {
-                'role': None,
-                'flat_number': None,
-                'building_block': None,
-                'is_verified': False,
-                'has_profile': False
-            }
-        
-        return JsonResponse({
-            'key': token.key,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_staff': user.is_staff,
-                'is_superuser': user.is_superuser
-            },
-            'profile': profile_data
-        })
+
+        token = get_login_token(user)
+        return JsonResponse(login_payload(user, token))
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -273,7 +163,7 @@ def google_login_url(request):
 def user_profile(request):
     """Get or update user profile"""
     try:
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        profile = get_profile(request) or UserProfile.objects.get_or_create(user=request.user)[0]
         
         if request.method == 'GET':
             serializer = UserProfileSerializer(profile)
@@ -283,6 +173,12 @@ def user_profile(request):
             serializer = UserProfileSerializer(profile, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                # ✅ Resize and strip EXIF/GPS from a new picture in the background
+                if 'profile_picture' in request.FILES:
+                    try:
+                        process_profile_picture.delay(profile.id)
+                    except Exception as e:
+                        logger.error(f"Could not queue profile picture processing: {e}")
                 return Response(serializer.data)
             return Response(serializer.errors, status=400)
     
@@ -294,7 +190,7 @@ def user_profile(request):
 def profile_exists(request):
     """Check if user has completed their profile"""
     try:
-        profile = UserProfile.objects.filter(user=request.user).first()
+        profile = get_profile(request)
         if profile:
             # Check if profile is complete (has required fields)
             is_complete = bool(
@@ -337,3 +233,44 @@ def test_registration(request):
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
+
+# ✅ Bulk resident onboarding from a CSV (Admin/Secretary only), run by a worker
+@api_view(['POST'])
+@permission_classes([IsManager])
+@parser_classes([MultiPartParser])
+def import_residents(request):
+    """Store an uploaded CSV and queue its import; poll the returned import_id for the report"""
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'A CSV file is required'}, status=400)
+    send_welcome = str(request.data.get('send_welcome_email', 'true')).lower() != 'false'
+    job = ResidentImport.objects.create(created_by=request.user, file=upload, send_welcome=send_welcome)
+    try:
+        import_residents_csv.delay(str(job.id))
+    except Exception as e:
+        logger.error(f"Could not queue resident import {job.id}: {e}")
+        job.file.delete(save=False)
+        job.status, job.error, job.finished_at = 'failed', 'could not queue the import', timezone.now()
+        job.save()
+        return Response(resident_import_data(job), status=503)
+    return Response(resident_import_data(job), status=202)
+
+# ✅ Progress and per-row errors of a resident import
+@api_view(['GET'])
+@permission_classes([IsManager])
+def resident_import_status(request, import_id):
+    """Status of an import; rows and created grow chunk by chunk while it runs"""
+    job = get_object_or_404(ResidentImport, id=import_id)
+    return Response(resident_import_data(job))
+
+def resident_import_data(job):
+    return {
+        'import_id': str(job.id),
+        'status': job.status,
+        'rows': job.rows,
+        'created': job.created,
+        'errors': job.errors,
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Society, IssueCategory, Issue, IssueImage, IssueComment, AgentAction
+from .models import Society, IssueCategory, Issue, IssueImage, IssueComment, AgentAction, PipelineRun, ImageBlob
 
 @admin.register(Society)
 class SocietyAdmin(admin.ModelAdmin):
@@ -22,6 +22,10 @@ class IssueAdmin(admin.ModelAdmin):
 class IssueImageAdmin(admin.ModelAdmin):
     list_display = ('issue', 'image', 'uploaded_at')
 
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'name', 'size', 'ref_count', 'updated_at')
+
 @admin.register(IssueComment)
 class IssueCommentAdmin(admin.ModelAdmin):
     list_display = ('issue', 'user', 'comment', 'is_internal', 'created_at')
@@ -29,6 +33,11 @@ class IssueCommentAdmin(admin.ModelAdmin):
 
 @admin.register(AgentAction)
 class AgentActionAdmin(admin.ModelAdmin):
-    list_display = ('issue', 'agent_type', 'action', 'confidence_score', 'processing_time', 'created_at')
+    list_display = ('issue', 'agent_type', 'action', 'confidence_score', 'processing_time', 'llm_ms', 'db_ms', 'queue_wait_ms', 'created_at')
     list_filter = ('agent_type',)
-    search_fields = ('action',)
\ No newline at end of file
+    search_fields = ('action',)
+
+@admin.register(PipelineRun)
+class PipelineRunAdmin(admin.ModelAdmin):
+    list_display = ('issue', 'status', 'current_stage', 'completed_stages', 'created_at', 'finished_at')
+    list_filter = ('status', 'current_stage')
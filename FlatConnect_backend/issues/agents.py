@@ -1,20 +1,54 @@
-import openai
+import asyncio
 import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from .models import Issue, IssueCategory, AgentAction
+from .models import Issue, AgentAction
+from . import classifier, heuristics
+from .audit import StageTiming, current_timing, get_audit_buffer
+from .circuitbreaker import HALF_OPEN, get_llm_breaker
+from .language import detect_language
+from .llm_backends import get_backend
+from .ratelimit import full_jitter_delay, get_limiter, is_rate_limit_error, retry_after_seconds
+from .tokens import compact_text, estimate_messages_tokens, estimate_tokens
+from .registry import Category, CategorySnapshot, category_registry
 from typing import Dict, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+LLM_MAX_TOKENS = 500
+# Answers like "Plumbing|0.9" or "3|0.8"
+LABEL_MAX_TOKENS = 20
+
+
 class BaseAgent:
+    # Waiters with a higher value get LLM capacity first, so issues already in
+    # the pipeline finish before new ones start
+    llm_priority = 0
+
     def __init__(self, agent_type: str):
         self.agent_type = agent_type
-        openai.api_key = settings.OPENAI_API_KEY
+
+    def start_timing(self, enqueued_at: Optional[float] = None) -> StageTiming:
+        """Begin collecting the timing breakdown for this stage run"""
+        queue_wait_ms = (time.time() - enqueued_at) * 1000 if enqueued_at else None
+        timing = StageTiming(queue_wait_ms)
+        current_timing.set(timing)
+        return timing
+
+    async def db(self, func, *args, **kwargs):
+        """Run a blocking ORM call from the agent's event loop"""
+        start = time.perf_counter()
+        try:
+            return await sync_to_async(func, thread_sensitive=True)(*args, **kwargs)
+        finally:
+            timing = current_timing.get()
+            if timing:
+                timing.db_ms += (time.perf_counter() - start) * 1000
 
     def log_action(self, issue: Issue, action: str, input_data: Dict, output_data: Dict, processing_time: float, confidence: Optional[float] = None):
-        """Log agent action for audit trail"""
-        AgentAction.objects.create(
+        """Log agent action for audit trail (buffered, see issues/audit.py)"""
+        agent_action = AgentAction(
             issue=issue,
             agent_type=self.agent_type,
             action=action,
@@ -23,66 +57,145 @@ class BaseAgent:
             confidence_score=confidence,
             processing_time=processing_time
         )
-
-    async def call_llm(self, prompt: str, system_prompt: str = None) -> str:
-        """Make LLM API call"""
+        timing = current_timing.get()
+        if timing:
+            agent_action.llm_ms = timing.llm_ms
+            agent_action.db_ms = timing.db_ms
+            agent_action.queue_wait_ms = timing.queue_wait_ms
+            agent_action.prompt_tokens = timing.prompt_tokens
+            agent_action.completion_tokens = timing.completion_tokens
+            agent_action.llm_calls = timing.llm_calls
+        get_audit_buffer().add(agent_action)
+
+    async def call_llm(self, prompt: str, system_prompt: str = None, max_tokens: int = LLM_MAX_TOKENS, purpose: str = "") -> str:
+        """Make LLM API call, within the shared rate limit and retrying 429s with backoff"""
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
 
+        # Fail fast while the LLM is known to be down; callers fall back to heuristics
+        breaker = get_llm_breaker()
+        permit = breaker.allow_request()
+        if permit is None:
+            return ""
+
+        limiter = get_limiter()
+        estimated_prompt_tokens = estimate_messages_tokens(messages)
+        estimated_tokens = estimated_prompt_tokens + max_tokens
+        timing = current_timing.get()
+
+        settled = False
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.1
-            )
-            return response['choices'][0]['message']['content'].strip()
-        except Exception as e:
-            logger.error(f"LLM API call failed: {e}")
+            for attempt in range(settings.LLM_MAX_RETRIES + 1):
+                try:
+                    lease = await limiter.acquire_async(estimated_tokens, self.llm_priority) if limiter else None
+                except Exception as e:
+                    # A broken limiter (e.g. its SQLite file is locked or unwritable) fails like the LLM
+                    logger.error(f"LLM rate limiter failed: {e}")
+                    return ""
+                used_tokens = None
+                usage = {}
+                call_start = time.perf_counter()
+                try:
+                    # Backends are blocking clients; keep the event loop free while they wait
+                    response = await asyncio.to_thread(
+                        get_backend().complete,
+                        messages,
+                        max_tokens=max_tokens,
+                        temperature=0.1,
+                        timeout=settings.LLM_REQUEST_TIMEOUT
+                    )
+                    usage = response['usage']
+                    used_tokens = usage.get('total_tokens')
+                    breaker.record_success()
+                    settled = True
+                    return response['content'].strip()
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        # Throttling means the provider is up; it must not trip the breaker
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    settled = True
+                    if is_rate_limit_error(e) and attempt < settings.LLM_MAX_RETRIES:
+                        if limiter:
+                            delay = limiter.backoff(attempt, retry_after_seconds(e))
+                        else:
+                            delay = full_jitter_delay(attempt, settings.LLM_BACKOFF_BASE, settings.LLM_BACKOFF_MAX)
+                        logger.warning(f"LLM rate limited, retrying in {delay:.1f}s (attempt {attempt + 1})")
+                        await asyncio.sleep(delay)
+                        continue
+                    logger.error(f"LLM API call failed: {e}")
+                    return ""
+                finally:
+                    if timing:
+                        timing.record_call(purpose, (time.perf_counter() - call_start) * 1000, estimated_prompt_tokens, usage)
+                    if lease:
+                        try:
+                            limiter.release(lease, used_tokens, estimated_tokens)
+                        except Exception as e:
+                            # The lease expires on its own after the lease TTL
+                            logger.error(f"Could not release LLM rate limit lease: {e}")
             return ""
+        finally:
+            # A probe cancelled or failing before it reached the LLM must not block every later probe
+            if permit == HALF_OPEN and not settled:
+                breaker.release_probe()
+
+
+# Normalizes the LANG part of the translation response to Issue.LANGUAGE_CHOICES codes
+LANGUAGE_CODES = {
+    "en": "en", "english": "en",
+    "hi": "hi", "hindi": "hi",
+    "mr": "mr", "marathi": "mr",
+}
 
 
 class IntakeAgent(BaseAgent):
     def __init__(self):
         super().__init__("intake_agent")
 
-    async def process_issue(self, issue_id: str) -> Dict[str, Any]:
+    async def process_issue(self, issue_id: str, enqueued_at: Optional[float] = None) -> Dict[str, Any]:
         start_time = time.time()
-        issue = Issue.objects.get(id=issue_id)
+        self.start_timing(enqueued_at)
+        issue = await self.db(Issue.objects.get, id=issue_id)
 
         input_data = {
             "title": issue.title,
-            "description": issue.description,
-            "location": issue.location
+            "description": issue.description
         }
 
         try:
-            # Enhance description
-            enhanced_desc = await self._enhance_description(issue.title, issue.description)
+            # Detect the reporter's language locally, before enhancement rewrites the text
+            language, language_confidence = detect_language(f"{issue.title}\n{issue.description}")
+
+            # Enhance description; very long descriptions are compacted first
+            compact_desc = compact_text(issue.description, settings.PROMPT_DESCRIPTION_MAX_TOKENS)
+            enhanced_desc = await self._enhance_description(issue.title, compact_desc)
             if enhanced_desc:
                 issue.description = enhanced_desc
 
-            # Detect language and translate to English
-            detected_lang, translated_text = await self._translate_to_english(issue.description)
+            # Translate to English (skipped for text detected as English)
+            detected_lang, translated_text = await self._translate_to_english(
+                issue.description, language, language_confidence
+            )
             issue.language = detected_lang
             issue.description_translated = translated_text or issue.description
+            # Compact English form, computed once and reused by every later stage
+            issue.description_compact = compact_text(issue.description_translated, settings.PROMPT_DESCRIPTION_MAX_TOKENS)
 
-            issue.save()
+            await self.db(issue.save)
 
             output_data = {
                 "description_enhanced": True,
                 "language_detected": detected_lang,
+                "translation_skipped": translated_text is None,
                 "next_agent": "categorization"
             }
 
             processing_time = time.time() - start_time
-            self.log_action(issue, "process_intake", input_data, output_data, processing_time)
-
-            # Trigger next agent
-            from .tasks import categorization_agent
-            categorization_agent.delay(str(issue.id))
+            await self.db(self.log_action, issue, "process_intake", input_data, output_data, processing_time)
 
             return {"status": "success", "data": output_data}
 
@@ -91,46 +204,54 @@ class IntakeAgent(BaseAgent):
             return {"status": "error", "message": str(e)}
 
     async def _enhance_description(self, title: str, description: str) -> Optional[str]:
+        # Bounding the answer keeps the enhanced description within the prompt budget of later stages
+        words = settings.PROMPT_DESCRIPTION_MAX_TOKENS * 3 // 4
         system_prompt = "You are an issue description enhancer. Make descriptions clear and actionable."
-        prompt = f"Title: {title}\nDescription: {description}\n\nEnhance the description."
-        result = await self.call_llm(prompt, system_prompt)
-        return result if result else description
+        prompt = f"Title: {title}\nDescription: {description}\n\nEnhance the description in at most {words} words."
+        result = await self.call_llm(prompt, system_prompt, max_tokens=settings.PROMPT_DESCRIPTION_MAX_TOKENS + 50, purpose="enhance")
+        return result or None
+
+    async def _translate_to_english(self, text: str, language: str, confidence: float) -> tuple[str, Optional[str]]:
+        """Return (language code, English text); the text is None when no translation was needed"""
+        if language == "en" and confidence >= settings.LANGUAGE_DETECTION_MIN_CONFIDENCE:
+            return "en", None
 
-    async def _translate_to_english(self, text: str) -> tuple[str, str]:
         system_prompt = "Detect language and translate to English. Respond in format: LANG|TRANSLATION"
         prompt = f"Text: {text}"
-        result = await self.call_llm(prompt, system_prompt)
-        parts = result.split('|')
-        return (parts[0].strip(), parts[1].strip()) if len(parts) > 1 else ("en", text)
+        max_tokens = min(LLM_MAX_TOKENS, estimate_tokens(text) + 50)
+        result = await self.call_llm(prompt, system_prompt, max_tokens=max_tokens, purpose="translate")
+        parts = result.split('|', 1)
+        if len(parts) < 2:
+            return language, text
+        return LANGUAGE_CODES.get(parts[0].strip().lower(), language), parts[1].strip()
 
 
 class CategorizationAgent(BaseAgent):
+    llm_priority = 1
+
     def __init__(self):
         super().__init__("categorization_agent")
 
-    async def process_issue(self, issue_id: str) -> Dict[str, Any]:
+    async def process_issue(self, issue_id: str, enqueued_at: Optional[float] = None) -> Dict[str, Any]:
         start_time = time.time()
-        issue = Issue.objects.get(id=issue_id)
+        self.start_timing(enqueued_at)
+        issue = await self.db(Issue.objects.get, id=issue_id)
 
-        input_data = {"title": issue.title, "description": issue.description_translated or issue.description}
+        input_data = {"title": issue.title, "description": issue.prompt_description}
 
         try:
-            categories = list(IssueCategory.objects.values_list('name', flat=True))
-            category_name, confidence = await self._categorize_issue(issue, categories)
+            categories = await self.db(category_registry.snapshot)
+            category, confidence, source = await self._categorize_issue(issue, categories)
 
-            if category_name:
-                category = IssueCategory.objects.get(name=category_name)
-                issue.category = category
+            if category:
+                issue.category_id = category.id
                 issue.status = 'categorized'
-                issue.save()
+                await self.db(issue.save)
 
-            output_data = {"category": category_name, "confidence": confidence}
+            output_data = {"category": category.name if category else None, "confidence": confidence, "source": source}
 
             processing_time = time.time() - start_time
-            self.log_action(issue, "categorize", input_data, output_data, processing_time, confidence)
-
-            from .tasks import priority_agent
-            priority_agent.delay(str(issue.id))
+            await self.db(self.log_action, issue, "categorize", input_data, output_data, processing_time, confidence)
 
             return {"status": "success", "data": output_data}
 
@@ -138,33 +259,66 @@ class CategorizationAgent(BaseAgent):
             logger.error(f"CategorizationAgent error: {e}")
             return {"status": "error", "message": str(e)}
 
-    async def _categorize_issue(self, issue: Issue, categories: list) -> tuple[str, float]:
-        system_prompt = f"Categorize issue into: {', '.join(categories)}"
-        prompt = f"Issue: {issue.title}\nDescription: {issue.description_translated or issue.description}\nRespond: CATEGORY|CONFIDENCE"
-        result = await self.call_llm(prompt, system_prompt)
+    async def _categorize_issue(self, issue: Issue, categories: CategorySnapshot) -> tuple[Optional[Category], float, str]:
+        if not categories:
+            return None, 0.0, "no_categories"
+
+        # Fast path: confident local predictions never reach the LLM
+        try:
+            prediction = classifier.predict(issue.title, issue.prompt_description)
+        except Exception as e:
+            logger.error(f"Local classifier failed: {e}")
+            prediction = None
+        if prediction:
+            category_name, confidence = prediction
+            category = categories.resolve(category_name)
+            if category and confidence >= settings.ISSUE_CLASSIFIER_MIN_CONFIDENCE:
+                return category, confidence, "local_model"
+
+        system_prompt = f"Categorize issue into: {', '.join(categories.names)}"
+        prompt = f"Issue: {issue.title}\nDescription: {issue.prompt_description}\nRespond: CATEGORY|CONFIDENCE"
+        result = await self.call_llm(prompt, system_prompt, max_tokens=LABEL_MAX_TOKENS, purpose="categorize")
         parts = result.split('|')
-        return (parts[0].strip(), float(parts[1].strip())) if len(parts) > 1 else (categories[0], 0.5)
+        if len(parts) > 1:
+            # LLM spelling often drifts from the stored name ("Electric", "plumbing issue")
+            category = categories.resolve(parts[0])
+            try:
+                confidence = float(parts[1].strip())
+            except ValueError:
+                category = None
+            if category:
+                return category, confidence, "llm"
+            logger.warning(f"Unmatched categorization response: {result!r}")
+
+        # LLM unavailable or unmatched: keyword rules, then the first category as before
+        match = heuristics.categorize(issue.title, issue.prompt_description, categories.names)
+        if match:
+            return categories.resolve(match[0]), match[1], "heuristic"
+        return categories.categories[0], 0.5, "fallback"
 
 
 class PriorityAgent(BaseAgent):
+    llm_priority = 2
+
     def __init__(self):
         super().__init__("priority_agent")
 
-    async def process_issue(self, issue_id: str) -> Dict[str, Any]:
+    async def process_issue(self, issue_id: str, enqueued_at: Optional[float] = None) -> Dict[str, Any]:
         start_time = time.time()
-        issue = Issue.objects.get(id=issue_id)
+        self.start_timing(enqueued_at)
+        issue = await self.db(Issue.objects.select_related('category').get, id=issue_id)
 
         input_data = {"category": issue.category.name if issue.category else None}
 
         try:
-            priority, confidence = await self._calculate_priority(issue)
+            priority, confidence, source = await self._calculate_priority(issue)
             issue.priority = priority
-            issue.save()
+            await self.db(issue.save)
 
-            output_data = {"priority": priority}
+            output_data = {"priority": priority, "source": source}
 
             processing_time = time.time() - start_time
-            self.log_action(issue, "prioritize", input_data, output_data, processing_time, confidence)
+            await self.db(self.log_action, issue, "prioritize", input_data, output_data, processing_time, confidence)
 
             # ✅ Removed auto-assignment. Admin will assign manually.
             return {"status": "success", "data": output_data}
@@ -173,12 +327,22 @@ class PriorityAgent(BaseAgent):
             logger.error(f"PriorityAgent error: {e}")
             return {"status": "error", "message": str(e)}
 
-    async def _calculate_priority(self, issue: Issue) -> tuple[int, float]:
+    async def _calculate_priority(self, issue: Issue) -> tuple[int, float, str]:
         system_prompt = "Determine issue priority: 1-Low, 2-Medium, 3-High, 4-Critical."
-        prompt = f"Category: {issue.category.name if issue.category else 'Unknown'}\nDescription: {issue.description_translated or issue.description}\nRespond: PRIORITY|CONFIDENCE"
-        result = await self.call_llm(prompt, system_prompt)
+        prompt = f"Category: {issue.category.name if issue.category else 'Unknown'}\nDescription: {issue.prompt_description}\nRespond: PRIORITY|CONFIDENCE"
+        result = await self.call_llm(prompt, system_prompt, max_tokens=LABEL_MAX_TOKENS, purpose="prioritize")
         parts = result.split('|')
-        return (int(parts[0].strip()), float(parts[1].strip())) if len(parts) > 1 else (2, 0.5)
+        if len(parts) > 1:
+            try:
+                priority = int(parts[0].strip())
+                if priority in dict(Issue.PRIORITY_CHOICES):
+                    return priority, float(parts[1].strip()), "llm"
+            except ValueError:
+                pass
+            logger.warning(f"Unparseable priority response: {result!r}")
+
+        priority, confidence = heuristics.prioritize(f"{issue.title}\n{issue.prompt_description}")
+        return priority, confidence, "heuristic"
 
 
 class AssignmentAgent(BaseAgent):
@@ -187,20 +351,20 @@ class AssignmentAgent(BaseAgent):
 
     async def process_issue(self, issue_id: str, user_id: str) -> Dict[str, Any]:
         start_time = time.time()
-        issue = Issue.objects.get(id=issue_id)
+        issue = await self.db(Issue.objects.get, id=issue_id)
         from django.contrib.auth import get_user_model
         User = get_user_model()
 
         try:
-            assigned_user = User.objects.get(id=user_id)
+            assigned_user = await self.db(User.objects.get, id=user_id)
             issue.assigned_to = assigned_user
             issue.status = 'assigned'
-            issue.save()
+            await self.db(issue.save)
 
             output_data = {"assigned_to": assigned_user.username}
 
             processing_time = time.time() - start_time
-            self.log_action(issue, "manual_assign", {"user_id": user_id}, output_data, processing_time)
+            await self.db(self.log_action, issue, "manual_assign", {"user_id": user_id}, output_data, processing_time)
 
             return {"status": "success", "data": output_data}
 
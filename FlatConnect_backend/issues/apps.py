@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class IssuesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'issues'
+
+    def ready(self):
+        import issues.signals  # Import signals when app is ready
+        from issues.phash import MAX_DISTANCE
+
+        # ✅ Fail at startup instead of in every image task
+        if not 0 <= settings.IMAGE_DUPLICATE_MAX_DISTANCE <= MAX_DISTANCE:
+            raise ImproperlyConfigured(
+                f'IMAGE_DUPLICATE_MAX_DISTANCE must be between 0 and {MAX_DISTANCE}'
+            )
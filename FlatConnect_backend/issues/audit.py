@@ -0,0 +1,102 @@
+"""Buffered AgentAction audit writes and per-stage timing.
+
+BaseAgent.log_action hands unsaved AgentAction rows to a process-wide
+buffer, which writes them with one bulk_create once it holds
+AUDIT_BUFFER_SIZE rows or its oldest row is AUDIT_FLUSH_SECONDS old. The
+tasks also flush at the end of each pipeline and on worker shutdown. Rows
+still buffered when a worker is killed are lost; that is the trade-off for
+not writing inside every stage.
+
+StageTiming collects where a stage spends its time (LLM, DB, queue wait) and
+its token usage, per LLM call and in total. It lives in a context variable,
+so concurrent stages in one process never mix their numbers.
+"""
+import contextvars
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from django.conf import settings
+
+from .models import AgentAction
+
+logger = logging.getLogger(__name__)
+
+
+class StageTiming:
+    def __init__(self, queue_wait_ms: Optional[float] = None):
+        self.queue_wait_ms = queue_wait_ms
+        self.llm_ms = 0.0
+        self.db_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = []
+
+    def record_call(self, purpose: str, ms: float, estimated_prompt_tokens: int, usage: dict):
+        """Account one LLM request; usage is empty when the request failed"""
+        prompt_tokens = usage.get('prompt_tokens')
+        completion_tokens = usage.get('completion_tokens')
+        self.llm_ms += ms
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.llm_calls.append({
+            'purpose': purpose,
+            'ms': round(ms, 1),
+            'estimated_prompt_tokens': estimated_prompt_tokens,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+        })
+
+
+current_timing: contextvars.ContextVar[Optional[StageTiming]] = contextvars.ContextVar('current_timing', default=None)
+
+
+class AuditBuffer:
+    def __init__(self, max_size: int, max_age_seconds: float):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self._actions: List[AgentAction] = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def add(self, action: AgentAction):
+        with self._lock:
+            if not self._actions:
+                self._oldest = time.monotonic()
+            self._actions.append(action)
+            due = len(self._actions) >= self.max_size
+        if due:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        oldest = self._oldest
+        if oldest is not None and time.monotonic() - oldest >= self.max_age_seconds:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            actions, self._actions, self._oldest = self._actions, [], None
+        if not actions:
+            return 0
+        try:
+            AgentAction.objects.bulk_create(actions, batch_size=self.max_size)
+        except Exception as e:
+            logger.error(f"Failed to write {len(actions)} agent actions: {e}")
+            return 0
+        return len(actions)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_audit_buffer() -> AuditBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditBuffer(settings.AUDIT_BUFFER_SIZE, settings.AUDIT_FLUSH_SECONDS)
+    return _buffer
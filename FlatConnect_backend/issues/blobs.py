@@ -0,0 +1,87 @@
+"""Reference counting and garbage collection for content-addressed image blobs.
+
+ContentAddressedStorage registers a blob row when it stores (or finds) a
+file; IssueImage rows add and remove references (signals for single
+saves and deletes, explicit calls for bulk inserts). A blob whose count is
+zero is deleted, with its renditions, once it has been untouched for
+IMAGE_BLOB_GC_GRACE_SECONDS, so an upload that has been stored but not yet
+attached to an IssueImage is never collected.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ImageBlob
+from .storage import blob_digest, image_storage
+
+logger = logging.getLogger(__name__)
+
+# Insert/touch rounds before giving up on a blob that GC keeps deleting
+REGISTER_ATTEMPTS = 3
+
+
+def register_blob(digest: str, name: str, size: int) -> Tuple[str, bool]:
+    """Return (stored name, created) for a digest, touching existing blobs so GC leaves them alone"""
+    for _ in range(REGISTER_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                ImageBlob.objects.create(digest=digest, name=name, size=size)
+            return name, True
+        except IntegrityError:
+            # Touch before reading: once updated_at is fresh GC skips the row, and a
+            # zero rowcount means GC deleted it (and its file) since the insert failed
+            if ImageBlob.objects.filter(digest=digest).update(updated_at=timezone.now()):
+                return ImageBlob.objects.values_list('name', flat=True).get(digest=digest), False
+    raise IntegrityError(f"Could not register blob {digest}")
+
+
+def _counts(names: Iterable[str]) -> Dict[str, int]:
+    return Counter(digest for digest in map(blob_digest, names) if digest)
+
+
+def add_references(names: Iterable[str]):
+    for digest, count in _counts(names).items():
+        ImageBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + count, updated_at=timezone.now())
+
+
+def remove_references(names: Iterable[str]):
+    for digest, count in _counts(names).items():
+        updated = ImageBlob.objects.filter(digest=digest, ref_count__gte=count).update(
+            ref_count=F('ref_count') - count, updated_at=timezone.now()
+        )
+        if not updated:
+            logger.warning(f"Reference count of blob {digest} would go negative")
+            ImageBlob.objects.filter(digest=digest).update(ref_count=0, updated_at=timezone.now())
+
+
+def rendition_dir(digest: str) -> str:
+    return f"issue_images/renditions/{digest}"
+
+
+def collect_garbage(dry_run: bool = False) -> Dict[str, int]:
+    """Delete unreferenced blobs older than the grace period, and their renditions"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IMAGE_BLOB_GC_GRACE_SECONDS)
+    candidates = ImageBlob.objects.filter(ref_count=0, updated_at__lt=cutoff)
+    stats = {'blobs': 0, 'bytes': 0}
+    for digest, name, size in candidates.values_list('digest', 'name', 'size').iterator():
+        if not dry_run:
+            # Re-checked in the DELETE: a reference or upload may have arrived since
+            deleted, _ = ImageBlob.objects.filter(digest=digest, ref_count=0, updated_at__lt=cutoff).delete()
+            if not deleted:
+                continue
+            image_storage().delete(name)
+            directory = rendition_dir(digest)
+            if default_storage.exists(directory):
+                for filename in default_storage.listdir(directory)[1]:
+                    default_storage.delete(f"{directory}/{filename}")
+        stats['blobs'] += 1
+        stats['bytes'] += size
+    logger.info(f"Image blob GC: {stats}")
+    return stats
@@ -0,0 +1,174 @@
+"""Resumable chunked uploads for slow, flaky mobile connections.
+
+A client declares the file (name, size, SHA-256) and then sends it in
+chunks, each tagged with the offset it starts at. Chunks are streamed to a
+file under CHUNKED_UPLOAD_DIR in small reads, so memory stays bounded
+whatever the chunk size. After a dropped connection the client asks for
+the current offset and resends only from there. Finalizing verifies the
+whole-file checksum and that the file is an image, then hands the file to
+uploads.attach_images(), the same path multipart uploads take.
+
+Chunks are positional writes: a late duplicate of an old chunk rewrites
+the same bytes, and the offset only advances with a conditional UPDATE, so
+no lock is held while a chunk trickles in.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from .models import ChunkedUpload, IssueImage
+from .uploads import attach_images
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class AssembledFile(File):
+    """Lets the storage move the assembled file into place instead of copying it"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload: ChunkedUpload) -> str:
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+
+def start_upload(user, issue, filename: str, size: int, sha256: str) -> ChunkedUpload:
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_BYTES:
+        raise UploadError(f"size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_BYTES} bytes")
+    if len(sha256) != 64 or any(char not in '0123456789abcdef' for char in sha256.lower()):
+        raise UploadError("sha256 must be a hex SHA-256 digest")
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload = ChunkedUpload.objects.create(
+        user=user, issue=issue, filename=os.path.basename(filename)[:255] or 'upload', size=size, sha256=sha256.lower()
+    )
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload: ChunkedUpload, offset: int, stream, length: int, checksum: Optional[str] = None) -> int:
+    """Write length bytes from stream at offset; returns the new offset"""
+    if upload.status != 'uploading':
+        raise UploadError("Upload is already finalized", 409, upload.offset)
+    if offset != upload.offset:
+        raise UploadError("Offset does not match the bytes received", 409, upload.offset)
+    if length <= 0 or length > settings.CHUNKED_UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(f"Chunks must be between 1 and {settings.CHUNKED_UPLOAD_CHUNK_MAX_BYTES} bytes", 413, upload.offset)
+    if offset + length > upload.size:
+        raise UploadError("Chunk goes past the declared size", 400, upload.offset)
+
+    sha = hashlib.sha256()
+    received = 0
+    with open(part_path(upload), 'r+b') as part:
+        part.seek(offset)
+        while received < length:
+            data = stream.read(min(READ_SIZE, length - received))
+            if not data:
+                break
+            part.write(data)
+            sha.update(data)
+            received += len(data)
+
+    if received != length:
+        raise UploadError("Chunk was cut short; resend it", 400, upload.offset)
+    if checksum and checksum.lower() != sha.hexdigest():
+        raise UploadError("Chunk checksum mismatch; resend it", 400, upload.offset)
+
+    advanced = ChunkedUpload.objects.filter(id=upload.id, offset=offset, status='uploading').update(
+        offset=F('offset') + received, updated_at=timezone.now()
+    )
+    if not advanced:
+        upload.refresh_from_db(fields=['offset'])
+        raise UploadError("Offset does not match the bytes received", 409, upload.offset)
+    return offset + received
+
+
+def _file_digest(path: str, size: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = size
+        while remaining:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            sha.update(data)
+            remaining -= len(data)
+    return sha.hexdigest()
+
+
+def finalize_upload(upload: ChunkedUpload) -> IssueImage:
+    """Verify the assembled file and attach it to the issue; safe to retry"""
+    if upload.status == 'complete' and upload.image_id:
+        return upload.image
+    if upload.offset != upload.size:
+        raise UploadError("Upload is incomplete", 409, upload.offset)
+    if not ChunkedUpload.objects.filter(id=upload.id, status='uploading').update(status='finalizing'):
+        raise UploadError("Upload is being finalized", 409, upload.offset)
+
+    path = part_path(upload)
+    try:
+        # A late duplicate chunk may have left bytes past the end
+        os.truncate(path, upload.size)
+        if _file_digest(path, upload.size) != upload.sha256:
+            # Something was corrupted on the way; the client has to start over
+            ChunkedUpload.objects.filter(id=upload.id).update(offset=0, status='uploading')
+            raise UploadError("Checksum mismatch; upload the file again", 400, 0)
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:
+            raise UploadError("File is not a valid image")
+
+        with open(path, 'rb') as f:
+            images = attach_images(upload.issue, [AssembledFile(f, name=upload.filename)])
+        if not images:
+            raise UploadError("Could not store the image", 500)
+    except Exception:
+        ChunkedUpload.objects.filter(id=upload.id, status='finalizing').update(status='uploading')
+        raise
+
+    ChunkedUpload.objects.filter(id=upload.id).update(status='complete', image=images[0], updated_at=timezone.now())
+    if os.path.exists(path):
+        # Still there when the storage already had this content
+        os.remove(path)
+    return images[0]
+
+
+def upload_status(upload: ChunkedUpload) -> Dict[str, Any]:
+    return {
+        "upload_id": str(upload.id),
+        "issue_id": str(upload.issue_id),
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.offset,
+        "status": upload.status,
+        "image_id": upload.image_id,
+        "chunk_max_bytes": settings.CHUNKED_UPLOAD_CHUNK_MAX_BYTES,
+    }
+
+
+def expire_uploads() -> int:
+    """Delete unfinished uploads older than CHUNKED_UPLOAD_TTL_HOURS and their part files"""
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_TTL_HOURS)
+    stale = list(ChunkedUpload.objects.filter(updated_at__lt=cutoff).exclude(status='complete'))
+    for upload in stale:
+        try:
+            os.remove(part_path(upload))
+        except FileNotFoundError:
+            pass
+    ChunkedUpload.objects.filter(id__in=[upload.id for upload in stale]).delete()
+    return len(stale)
@@ -0,0 +1,115 @@
+"""Circuit breaker for the LLM dependency.
+
+Tracks call outcomes over a rolling window. Once the failure rate crosses the
+threshold the breaker opens and BaseAgent.call_llm fails fast, so agent
+stages fall back to local heuristics instead of waiting out timeouts. After
+a cool-down a single half-open probe is let through; its outcome closes or
+re-opens the breaker.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 5,
+                 window_seconds: float = 60.0, open_seconds: float = 30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes = deque()  # (timestamp, succeeded)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> Optional[str]:
+        """None to fail fast, HALF_OPEN for the probe (which must record an outcome or release_probe), else CLOSED"""
+        with self._lock:
+            if self._state == CLOSED:
+                return CLOSED
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return None
+                self._state = HALF_OPEN
+            # Half-open: exactly one probe at a time
+            if self._probe_in_flight:
+                return None
+            self._probe_in_flight = True
+            return HALF_OPEN
+
+    def release_probe(self):
+        """Give up a probe that ended without an outcome (cancelled, or failed before calling out)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                logger.info(f"Circuit '{self.name}' closed after successful probe")
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._probe_in_flight = False
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._record(False)
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _record(self, succeeded: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, succeeded))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning(f"Circuit '{self.name}' open for {self.open_seconds:.0f}s")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_llm_breaker() -> CircuitBreaker:
+    """Process-wide breaker guarding LLM calls"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'llm',
+                    failure_rate=settings.LLM_BREAKER_FAILURE_RATE,
+                    min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                    window_seconds=settings.LLM_BREAKER_WINDOW,
+                    open_seconds=settings.LLM_BREAKER_OPEN_SECONDS,
+                )
+    return _breaker
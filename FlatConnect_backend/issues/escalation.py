@@ -0,0 +1,116 @@
+"""Escalation of issues that sit too long in an open status.
+
+An issue is stale when it has not been updated for longer than the SLA of
+its priority (settings.ISSUE_SLA_HOURS). The scan walks each monitored
+status with keyset pagination over the (status, updated_at) index, so it
+only reads issues older than the shortest SLA and never loads a whole
+status at once. Each chunk is escalated in its own short transaction: the
+rows are re-checked and locked (skipping rows another transaction holds),
+their priority is bumped one level and updated_at is reset, which also
+restarts their SLA clock so they are not escalated again on the next scan.
+Secretaries get one Notification per escalated issue, bulk inserted.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .models import Issue, Notification
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+MONITORED_STATUSES = ('new', 'assigned', 'in_progress')
+MAX_PRIORITY = max(value for value, _ in Issue.PRIORITY_CHOICES)
+
+
+def _secretary_ids() -> List[int]:
+    return list(User.objects.filter(is_active=True, profile__role='secretary').values_list('id', flat=True))
+
+
+def _escalate(status: str, stale: List[tuple], cutoffs: Dict[int, object], default_cutoff, secretary_ids: List[int], now) -> int:
+    """Bump and notify one chunk of stale (id, priority, updated_at, title) rows"""
+    titles = {issue_id: title for issue_id, _, _, title in stale}
+    by_priority = defaultdict(list)
+    for issue_id, priority, _, _ in stale:
+        by_priority[priority].append(issue_id)
+
+    escalated = []
+    with transaction.atomic():
+        for priority, ids in by_priority.items():
+            # The issue may have been updated or closed since the chunk was read
+            locked = list(
+                Issue.objects.select_for_update(skip_locked=True)
+                .filter(id__in=ids, status=status, priority=priority,
+                        updated_at__lt=cutoffs.get(priority, default_cutoff))
+                .values_list('id', flat=True)
+            )
+            if not locked:
+                continue
+            new_priority = min(priority + 1, MAX_PRIORITY)
+            Issue.objects.filter(id__in=locked).update(priority=new_priority, updated_at=now)
+            escalated.extend((issue_id, new_priority) for issue_id in locked)
+
+        priority_names = dict(Issue.PRIORITY_CHOICES)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                issue_id=issue_id,
+                message=f"Issue '{titles[issue_id]}' has been {status.replace('_', ' ')} past its SLA; "
+                        f"priority is now {priority_names[new_priority]}",
+                notification_type='issue_escalated',
+            )
+            for issue_id, new_priority in escalated
+            for user_id in secretary_ids
+        ], batch_size=1000)
+    return len(escalated)
+
+
+def escalate_stale_issues(now=None, chunk_size: Optional[int] = None, dry_run: bool = False,
+                          issues: Optional[QuerySet] = None) -> Dict[str, float]:
+    """Scan the monitored statuses once (of issues, default all); returns counts and the elapsed time"""
+    start = time.perf_counter()
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.ESCALATION_CHUNK_SIZE
+    cutoffs = {priority: now - timedelta(hours=hours) for priority, hours in settings.ISSUE_SLA_HOURS.items()}
+    # Nothing updated after the shortest SLA's cutoff can be stale
+    scan_cutoff = max(cutoffs.values())
+    secretary_ids = _secretary_ids()
+    issues = Issue.objects.all() if issues is None else issues
+
+    stats = {'scanned': 0, 'stale': 0, 'escalated': 0, 'notifications': 0, 'chunks': 0}
+    for status in MONITORED_STATUSES:
+        last = None
+        while True:
+            query = issues.filter(status=status, updated_at__lt=scan_cutoff)
+            if last is not None:
+                query = query.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+            rows = list(
+                query.order_by('updated_at', 'id').values_list('id', 'priority', 'updated_at', 'title')[:chunk_size]
+            )
+            if not rows:
+                break
+            last = rows[-1][2], rows[-1][0]
+
+            stale = [row for row in rows if row[2] < cutoffs.get(row[1], scan_cutoff)]
+            stats['chunks'] += 1
+            stats['scanned'] += len(rows)
+            stats['stale'] += len(stale)
+            if stale and not dry_run:
+                escalated = _escalate(status, stale, cutoffs, scan_cutoff, secretary_ids, now)
+                stats['escalated'] += escalated
+                stats['notifications'] += escalated * len(secretary_ids)
+            if len(rows) < chunk_size:
+                break
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(f"Escalation scan: {stats}")
+    return stats
@@ -0,0 +1,71 @@
+"""Deterministic keyword rules used when the LLM is unavailable.
+
+They stand in for CategorizationAgent and PriorityAgent while the LLM
+circuit breaker is open or a response cannot be parsed.
+"""
+import re
+from typing import Iterable, Optional, Tuple
+
+# Keywords per category; keys are matched case-insensitively against IssueCategory names
+CATEGORY_KEYWORDS = {
+    'plumbing': ['leak', 'leaking', 'leakage', 'tap', 'pipe', 'drain', 'drainage', 'flush', 'sewage',
+                 'water', 'tank', 'seepage', 'geyser', 'overflow', 'blocked'],
+    'electrical': ['light', 'power', 'electricity', 'electric', 'fan', 'switch', 'wire', 'wiring',
+                   'meter', 'mcb', 'socket', 'spark', 'sparks', 'short circuit', 'voltage', 'tripping'],
+    'cleaning': ['garbage', 'trash', 'dirty', 'clean', 'cleaning', 'dust', 'sweep', 'waste', 'litter',
+                 'smell', 'stink'],
+    'security': ['guard', 'gate', 'theft', 'stolen', 'cctv', 'camera', 'intruder', 'lock', 'stranger',
+                 'security', 'visitor'],
+    'lift': ['lift', 'elevator'],
+    'elevator': ['lift', 'elevator'],
+    'parking': ['parking', 'parked', 'car', 'vehicle', 'bike', 'scooter'],
+    'pest control': ['pest', 'cockroach', 'cockroaches', 'rat', 'rats', 'mosquito', 'mosquitoes',
+                     'termite', 'termites', 'bees'],
+    'maintenance': ['broken', 'repair', 'crack', 'paint', 'tiles', 'door', 'window'],
+}
+
+# Checked from most to least severe; the first level with a hit wins
+PRIORITY_KEYWORDS = [
+    (4, ['fire', 'smoke', 'gas leak', 'short circuit', 'spark', 'sparks', 'electrocution', 'shock',
+         'flood', 'flooding', 'collapse', 'trapped', 'stuck in lift', 'emergency']),
+    (3, ['no water', 'water supply', 'not working', 'power cut', 'no electricity', 'overflow',
+         'sewage', 'theft', 'stolen', 'leakage', 'leaking', 'stuck']),
+    (1, ['paint', 'suggestion', 'cosmetic', 'minor', 'request', 'whenever possible']),
+]
+DEFAULT_PRIORITY = 2
+
+_pattern_cache = {}
+
+
+def _pattern(keyword: str):
+    if keyword not in _pattern_cache:
+        _pattern_cache[keyword] = re.compile(r'\b' + re.escape(keyword) + r'\b')
+    return _pattern_cache[keyword]
+
+
+def _hits(text: str, keywords: Iterable[str]) -> int:
+    return sum(1 for keyword in keywords if _pattern(keyword).search(text))
+
+
+def categorize(title: str, description: str, categories: Iterable[str]) -> Optional[Tuple[str, float]]:
+    """Best keyword match among the given category names, or None when nothing matches"""
+    text = f"{title or ''} {description or ''}".lower()
+    best_name, best_hits = None, 0
+    for name in categories:
+        keywords = CATEGORY_KEYWORDS.get(name.strip().lower())
+        if not keywords:
+            continue
+        hits = _hits(text, keywords)
+        if hits > best_hits:
+            best_name, best_hits = name, hits
+    if best_name is None:
+        return None
+    return best_name, min(0.8, 0.4 + 0.1 * best_hits)
+
+
+def prioritize(description: str) -> Tuple[int, float]:
+    text = (description or '').lower()
+    for priority, keywords in PRIORITY_KEYWORDS:
+        if _hits(text, keywords):
+            return priority, 0.6
+    return DEFAULT_PRIORITY, 0.3
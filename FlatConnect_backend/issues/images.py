@@ -0,0 +1,171 @@
+"""Background processing of uploaded images.
+
+Phones upload 5-10 MB JPEGs that carry EXIF metadata, GPS position
+included. image_analysis_agent decodes each pending IssueImage once in a
+pool worker, writes WebP renditions (settings.IMAGE_RENDITIONS) without any
+metadata and records the original's dimensions and perceptual hash
+(issues/phash.py). The API only hands out rendition URLs, so list views
+download kilobytes and never the original.
+"""
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .blobs import rendition_dir
+from .models import IssueImage
+from .phash import BAND_FIELDS, dhash, link_duplicates, set_hash, to_unsigned
+from .storage import blob_digest
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 0x0112
+# EXIF orientations that rotate by 90 degrees and so swap width and height
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def render(data: bytes, sizes: Dict[str, int], quality: int) -> Dict:
+    """Decode an image once and encode a WebP per size; runs in a pool worker.
+
+    Returns {'width', 'height', 'renditions': {name: webp bytes}, 'dhash': int}.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        width, height = original.size
+        if original.getexif().get(ORIENTATION_TAG) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        # JPEG only: decode straight at a power-of-two reduction of the largest size
+        largest = max(sizes.values())
+        original.draft('RGB', (largest, largest))
+        # Bake the rotation into the pixels before the EXIF that describes it is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+        renditions = {}
+        # Largest first, each one downscaled from the previous
+        for name, edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            # No exif/xmp arguments: the WebP carries no metadata
+            image.save(buffer, 'WEBP', quality=quality, method=4)
+            renditions[name] = buffer.getvalue()
+        # From the smallest rendition: the hash only needs 9x8 pixels
+        image_hash = dhash(image)
+
+    return {'width': width, 'height': height, 'renditions': renditions, 'dhash': image_hash}
+
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if multiprocessing.current_process().daemon:
+                    # Daemonic processes may not have children
+                    _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS,
+                                                   thread_name_prefix='images')
+                else:
+                    _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_file(field_file) -> bytes:
+    with field_file.open('rb') as f:
+        return f.read()
+
+
+def rendition_path(image: IssueImage, name: str) -> str:
+    # Content-addressed originals share their renditions
+    digest = blob_digest(image.image.name)
+    if digest:
+        return f"{rendition_dir(digest)}/{name}.webp"
+    return f"issue_images/renditions/{image.id}/{name}.webp"
+
+
+def _save_rendition(path: str, content: bytes) -> str:
+    if default_storage.exists(path):
+        return path
+    return default_storage.save(path, ContentFile(content))
+
+
+def rendition_urls(image: IssueImage) -> Dict[str, Optional[str]]:
+    """URL per rendition; None placeholders until processing has finished"""
+    return {
+        name: default_storage.url(image.renditions[name]) if name in image.renditions else None
+        for name in settings.IMAGE_RENDITIONS
+    }
+
+
+def _processed_copy(image: IssueImage) -> Optional[Dict]:
+    """Results of an earlier image with the same content-addressed file, if any"""
+    if not blob_digest(image.image.name):
+        return None
+    return IssueImage.objects.filter(image=image.image.name, processing_status='ready').values(
+        'width', 'height', 'renditions', 'dhash').first()
+
+
+def process_issue_images(issue_id) -> Dict[str, int]:
+    """Render every pending image of an issue, in parallel on the pool"""
+    images = list(IssueImage.objects.filter(issue_id=issue_id, processing_status='pending').select_related('issue'))
+    # Keyed by file name: identical photos are decoded once
+    futures = {}
+    for image in images:
+        done = _processed_copy(image)
+        if done:
+            image.width, image.height, image.renditions = done['width'], done['height'], done['renditions']
+            set_hash(image, None if done['dhash'] is None else to_unsigned(done['dhash']))
+            image.processing_status = 'ready'
+            continue
+        if image.image.name in futures:
+            continue
+        try:
+            data = read_file(image.image)
+        except Exception as e:
+            logger.error(f"Could not read image {image.id}: {e}")
+            image.processing_status = 'failed'
+            continue
+        futures[image.image.name] = get_executor().submit(
+            render, data, settings.IMAGE_RENDITIONS, settings.IMAGE_WEBP_QUALITY
+        )
+
+    for image in images:
+        if image.processing_status != 'pending':
+            continue
+        try:
+            result = futures[image.image.name].result()
+            image.renditions = {
+                name: _save_rendition(rendition_path(image, name), content)
+                for name, content in result['renditions'].items()
+            }
+            image.width, image.height = result['width'], result['height']
+            set_hash(image, result['dhash'])
+            image.processing_status = 'ready'
+        except Exception as e:
+            logger.error(f"Could not process image {image.id}: {e}")
+            image.processing_status = 'failed'
+
+    IssueImage.objects.bulk_update(images, ['processing_status', 'width', 'height', 'renditions', 'dhash', *BAND_FIELDS])
+    ready = [image for image in images if image.processing_status == 'ready']
+    duplicates = link_duplicates([image for image in ready if image.dhash is not None])
+    return {'processed': len(ready), 'failed': len(images) - len(ready), 'duplicates': duplicates}
@@ -0,0 +1,107 @@
+"""Offline language detection for issue text (en / hi / mr).
+
+Devanagari script share separates English from Hindi/Marathi, and weighted
+character n-grams separate Hindi from Marathi. IntakeAgent uses this to skip
+the LLM translation call for plain English complaints.
+"""
+import re
+from typing import Tuple
+
+DEVANAGARI_START = 0x0900
+DEVANAGARI_END = 0x097F
+
+# Below this share of Devanagari letters the text is treated as Latin script
+DEVANAGARI_MIN_SHARE = 0.15
+
+# Positive weights favour Marathi, negative weights favour Hindi
+DEVANAGARI_NGRAM_WEIGHTS = {
+    'ळ': 3.0,
+    'आहे': 3.0,
+    'नाही': 2.5,
+    'च्या': 2.0,
+    'मध्ये': 2.5,
+    'झाल': 2.0,
+    'आम्ही': 2.0,
+    'आमच': 2.0,
+    'पाणी': 1.5,
+    'करा': 1.0,
+    'येत': 1.0,
+    'होत': 0.5,
+    'चा ': 1.0,
+    'ची ': 1.0,
+    'चे ': 1.0,
+    'ला ': 0.5,
+    'है': -3.0,
+    'हैं': -1.0,
+    'नहीं': -3.0,
+    'में': -2.5,
+    'रहा': -2.0,
+    'रही': -2.0,
+    'गया': -1.5,
+    'था': -1.0,
+    'लिए': -1.5,
+    'और': -1.5,
+    'पानी': -1.5,
+    'हम ': -1.0,
+    ' का ': -1.0,
+    ' की ': -1.0,
+    ' के ': -1.0,
+    ' से ': -1.0,
+}
+
+# Common words of romanized Hindi/Marathi ("paani nahi aa raha hai"). Words that
+# are also English ("hot", "yet", "ko") are left out: one of them in a short
+# English complaint would otherwise cross ROMANIZED_MIN_SHARE.
+ROMANIZED_HINDI_WORDS = {
+    'hai', 'hain', 'nahi', 'nahin', 'raha', 'rahi', 'rahe', 'mein', 'aur', 'kya', 'bahut',
+    'paani', 'hota', 'gaya', 'tha', 'se', 'ka', 'ki', 'ke', 'bhi', 'abhi', 'kal',
+}
+ROMANIZED_MARATHI_WORDS = {
+    'ahe', 'aahe', 'nahi', 'nahiye', 'madhe', 'madhye', 'pani', 'zala', 'zhala',
+    'kara', 'amhi', 'amcha', 'amchya', 'khup', 'aata',
+}
+ROMANIZED_MIN_SHARE = 0.2
+
+_word_re = re.compile(r"[a-z]+")
+
+
+def _is_devanagari(char: str) -> bool:
+    return DEVANAGARI_START <= ord(char) <= DEVANAGARI_END
+
+
+def _score_devanagari(text: str) -> float:
+    padded = f" {text} "
+    return sum(weight * padded.count(ngram) for ngram, weight in DEVANAGARI_NGRAM_WEIGHTS.items())
+
+
+def _hindi_or_marathi(score: float) -> Tuple[str, float]:
+    # Map the score onto a confidence; zero evidence means a coin flip leaning Hindi
+    confidence = min(0.99, 0.5 + abs(score) / 10)
+    return ('mr', confidence) if score > 0 else ('hi', confidence)
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """Return (language code, confidence) for text, one of 'en', 'hi' or 'mr'"""
+    letters = [char for char in text or '' if char.isalpha()]
+    if not letters:
+        return 'en', 1.0
+
+    devanagari = sum(1 for char in letters if _is_devanagari(char))
+    devanagari_share = devanagari / len(letters)
+
+    if devanagari_share >= DEVANAGARI_MIN_SHARE:
+        return _hindi_or_marathi(_score_devanagari(text))
+
+    # Latin script: look for romanized Hindi/Marathi before calling it English
+    words = _word_re.findall(text.lower())
+    if not words:
+        return 'en', 0.5
+    hindi = sum(1 for word in words if word in ROMANIZED_HINDI_WORDS)
+    marathi = sum(1 for word in words if word in ROMANIZED_MARATHI_WORDS)
+    romanized_share = max(hindi, marathi) / len(words)
+    if romanized_share >= ROMANIZED_MIN_SHARE:
+        return ('mr' if marathi > hindi else 'hi'), min(0.9, 0.5 + romanized_share)
+
+    # Confidence falls as the text mixes in more Devanagari or romanized words
+    confidence = max(0.5, 1.0 - devanagari_share * 2 - romanized_share * 2)
+    return 'en', confidence
@@ -0,0 +1,196 @@
+"""Pluggable LLM backends used by BaseAgent.call_llm.
+
+settings.LLM_BACKEND selects the implementation:
+
+- OpenAIBackend: the real provider (default)
+- FakeLLMBackend: in-process deterministic stand-in
+- HTTPLLMBackend: any OpenAI-compatible endpoint, e.g. the local fake server
+  started with `python manage.py run_fake_llm`
+
+The fake answers in the formats the agents parse (CATEGORY|CONFIDENCE,
+PRIORITY|CONFIDENCE, LANG|TRANSLATION) with configurable latency and error
+rate, so the pipeline can be benchmarked without an API key.
+"""
+import math
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import heuristics
+from .language import detect_language
+from .tokens import estimate_messages_tokens, estimate_tokens
+
+
+class LLMError(Exception):
+    """Non-2xx response from an HTTP backend; mirrors the attributes of openai errors"""
+
+    def __init__(self, message: str, http_status: Optional[int] = None, headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.http_status = http_status
+        self.headers = headers or {}
+
+
+class BaseLLMBackend:
+    def complete(self, messages: List[Dict], max_tokens: int, temperature: float, timeout: float) -> Dict:
+        """Return {'content': str, 'usage': {'prompt_tokens', 'completion_tokens', 'total_tokens'}}"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release pooled connections"""
+
+
+class OpenAIBackend(BaseLLMBackend):
+    def __init__(self):
+        # Imported here so the fake backends work without the openai package
+        import openai
+        openai.api_key = settings.OPENAI_API_KEY
+        self.openai = openai
+
+    def complete(self, messages, max_tokens, temperature, timeout):
+        response = self.openai.ChatCompletion.create(
+            model=settings.LLM_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=timeout
+        )
+        return {
+            'content': response['choices'][0]['message']['content'],
+            'usage': dict(response.get('usage') or {}),
+        }
+
+
+class FakeLLM:
+    """Deterministic canned responder with a log-normal latency distribution"""
+
+    def __init__(self, latency_ms: float = 300.0, latency_sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Return (latency in seconds, HTTP status) for the next call"""
+        with self._lock:
+            latency = self.latency_ms * math.exp(self._random.gauss(0, self.latency_sigma)) / 1000
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return latency, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, 500
+        return latency, 200
+
+    def respond(self, messages: List[Dict]) -> str:
+        system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        user = next((m['content'] for m in messages if m['role'] == 'user'), '')
+
+        if system.startswith('Categorize issue into:'):
+            categories = [name.strip() for name in system.split(':', 1)[1].split(',') if name.strip()]
+            match = heuristics.categorize(user, '', categories)
+            if match:
+                return f"{match[0]}|0.9"
+            return f"{categories[0] if categories else 'General'}|0.6"
+
+        if system.startswith('Determine issue priority'):
+            priority, _ = heuristics.prioritize(user)
+            return f"{priority}|0.8"
+
+        if system.startswith('Detect language'):
+            text = user[len('Text: '):] if user.startswith('Text: ') else user
+            language, _ = detect_language(text)
+            return f"{language}|{text}"
+
+        # Description enhancement: echo the description back
+        match = re.search(r'Description: (.*?)(?:\n\n|$)', user, re.S)
+        return match.group(1) if match else user
+
+    @staticmethod
+    def usage(messages: List[Dict], content: str) -> Dict:
+        prompt_tokens = estimate_messages_tokens(messages)
+        completion_tokens = estimate_tokens(content) + 1
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+
+class FakeLLMBackend(BaseLLMBackend):
+    def __init__(self, fake: Optional[FakeLLM] = None):
+        self.fake = fake or FakeLLM(**settings.FAKE_LLM)
+
+    def complete(self, messages, max_tokens, temperature, timeout):
+        latency, status = self.fake.sample()
+        time.sleep(min(latency, timeout))
+        if latency > timeout:
+            raise LLMError("Fake LLM timed out")
+        if status != 200:
+            raise LLMError(f"Fake LLM returned {status}", http_status=status, headers={'retry-after': '1'} if status == 429 else None)
+        content = self.fake.respond(messages)
+        return {'content': content, 'usage': self.fake.usage(messages, content)}
+
+
+class HTTPLLMBackend(BaseLLMBackend):
+    def __init__(self):
+        self.url = settings.LLM_BASE_URL.rstrip('/') + '/v1/chat/completions'
+        self.session = requests.Session()
+
+    def complete(self, messages, max_tokens, temperature, timeout):
+        response = self.session.post(
+            self.url,
+            json={
+                'model': settings.LLM_MODEL,
+                'messages': messages,
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+            },
+            headers={'Authorization': f"Bearer {settings.OPENAI_API_KEY or ''}"},
+            timeout=timeout,
+        )
+        if response.status_code != 200:
+            raise LLMError(f"LLM endpoint returned {response.status_code}",
+                           http_status=response.status_code, headers=dict(response.headers))
+        data = response.json()
+        return {'content': data['choices'][0]['message']['content'], 'usage': data.get('usage') or {}}
+
+    def close(self):
+        self.session.close()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> BaseLLMBackend:
+    """Process-wide backend instance built from settings.LLM_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.LLM_BACKEND)()
+    return _backend
+
+
+def set_backend(backend: Optional[BaseLLMBackend]):
+    """Swap the process-wide backend (benchmarks); None re-reads settings on next use"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def close_backend():
+    """Close the process-wide backend, if one was built (worker shutdown)"""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        backend.close()
@@ -0,0 +1,80 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from issues.escalation import MONITORED_STATUSES, escalate_stale_issues
+from issues.models import Issue
+
+from .benchmark_pipeline import create_synthetic_issues
+
+BATCH_SIZE = 5000
+CLOSED_STATUSES = ('resolved', 'closed')
+
+
+@contextmanager
+def explicit_updated_at():
+    """Let bulk_create keep the generated updated_at instead of auto_now"""
+    field = Issue._meta.get_field('updated_at')
+    field.auto_now = False
+    try:
+        yield
+    finally:
+        field.auto_now = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic issues spread over the last 30 days and time the "
+        "escalation scan (dry run, then for real)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=100000)
+        parser.add_argument('--open-share', type=float, default=0.1,
+                            help="Share of issues in a monitored (open) status")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic issues afterwards")
+
+    def handle(self, *args, **options):
+        if options['issues'] < 1:
+            raise CommandError("--issues must be positive")
+
+        template = create_synthetic_issues(1)[0]
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        created = 0
+        with explicit_updated_at():
+            while created < options['issues']:
+                batch = []
+                for i in range(created, min(created + BATCH_SIZE, options['issues'])):
+                    is_open = rng.random() < options['open_share']
+                    batch.append(Issue(
+                        society_id=template.society_id,
+                        reporter_id=template.reporter_id,
+                        title=f"Escalation benchmark #{i}",
+                        description="Synthetic issue",
+                        status=rng.choice(MONITORED_STATUSES if is_open else CLOSED_STATUSES),
+                        priority=rng.randint(1, 4),
+                        updated_at=now - timedelta(seconds=rng.uniform(0, 30 * 86400)),
+                    ))
+                Issue.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                created += len(batch)
+        self.stdout.write(f"Created {created} issues ({options['open_share']:.0%} open)")
+
+        # Only the synthetic issues, so the benchmark never escalates real ones
+        benchmark_issues = Issue.objects.filter(society_id=template.society_id)
+        try:
+            for dry_run in (True, False):
+                stats = escalate_stale_issues(chunk_size=options['chunk_size'], dry_run=dry_run, issues=benchmark_issues)
+                label = "dry run" if dry_run else "escalate"
+                self.stdout.write(
+                    f"{label:<9} {stats['seconds']:7.2f}s scanned={stats['scanned']} stale={stats['stale']} "
+                    f"escalated={stats['escalated']} notifications={stats['notifications']} chunks={stats['chunks']}"
+                )
+        finally:
+            if not options['keep']:
+                benchmark_issues.delete()
@@ -0,0 +1,104 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from issues.language import detect_language
+from issues.models import Issue
+
+# Labelled sample of complaints in the mix we actually receive: mostly English,
+# some Hindi/Marathi in Devanagari and some romanized Hindi/Marathi.
+SAMPLE_CORPUS = [
+    ("Water leaking from the bathroom tap since morning", 'en'),
+    ("Lift in B wing is stuck between 3rd and 4th floor", 'en'),
+    ("Street light near gate 2 is not working at night", 'en'),
+    ("Garbage has not been collected for three days", 'en'),
+    ("Parking spot 14 is being used by a visitor car every day", 'en'),
+    ("Drainage overflow in the basement, very bad smell", 'en'),
+    ("Power fluctuation in flat A-302, fan and lights flicker", 'en'),
+    ("Security guard was absent at the main gate last night", 'en'),
+    ("Water tank cleaning is overdue, water looks muddy", 'en'),
+    ("Stray dogs near the children's play area", 'en'),
+    ("Main door lock of the terrace is broken", 'en'),
+    ("Seepage in the bedroom wall after the rain", 'en'),
+    ("Gym treadmill belt is torn, please replace", 'en'),
+    ("Intercom not working in C-105", 'en'),
+    ("Short circuit sparks from the meter box on ground floor", 'en'),
+    ("Please fix the broken tiles in the lobby", 'en'),
+    ("No water supply in A wing since 6 AM", 'en'),
+    ("Pest control needed in the common corridor, cockroaches everywhere", 'en'),
+    ("CCTV camera at the back gate is not recording", 'en'),
+    ("Noise from construction work after 10 pm", 'en'),
+    ("Geyser tripping the MCB in flat 804", 'en'),
+    ("Swimming pool water is green and dirty", 'en'),
+    ("Visitor parking board fell down near the clubhouse", 'en'),
+    ("Fire extinguisher on 7th floor has expired", 'en'),
+    ("बाथरूम में पानी का रिसाव हो रहा है", 'hi'),
+    ("लिफ्ट दो दिन से बंद है, बुजुर्गों को बहुत परेशानी हो रही है", 'hi'),
+    ("कचरा तीन दिन से नहीं उठाया गया", 'hi'),
+    ("मेरे फ्लैट में बिजली नहीं है", 'hi'),
+    ("पार्किंग में किसी और की गाड़ी खड़ी है", 'hi'),
+    ("बाथरूममध्ये पाणी गळत आहे, नळ दुरुस्त करा", 'mr'),
+    ("लिफ्ट दोन दिवसांपासून बंद आहे", 'mr'),
+    ("आमच्या इमारतीमध्ये पाणी येत नाही", 'mr'),
+    ("कचरा तीन दिवसांपासून उचलला नाही", 'mr'),
+    ("पार्किंगमध्ये दुसऱ्याची गाडी लावली आहे", 'mr'),
+    ("paani nahi aa raha hai subah se", 'hi'),
+    ("lift kal se band hai, bahut problem ho rahi hai", 'hi'),
+    ("amchya building madhe pani yet nahi", 'mr'),
+    ("light gelay, meter box madhe spark zala aahe", 'mr'),
+]
+
+
+class Command(BaseCommand):
+    help = "Report how many translation LLM calls the offline language detector avoids"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-db', type=int, default=0, metavar='N',
+                            help="Also run over the N most recent issue descriptions (unlabelled)")
+
+    def handle(self, *args, **options):
+        threshold = settings.LANGUAGE_DETECTION_MIN_CONFIDENCE
+
+        self.stdout.write(f"Labelled corpus ({len(SAMPLE_CORPUS)} samples, threshold {threshold:.2f})")
+        results = self._run([text for text, _ in SAMPLE_CORPUS], threshold)
+
+        correct = Counter()
+        totals = Counter()
+        wrongly_skipped = 0
+        for (text, expected), (language, skipped) in zip(SAMPLE_CORPUS, results['detections']):
+            totals[expected] += 1
+            correct[expected] += language == expected
+            # A non-English complaint that skips translation is the costly mistake
+            wrongly_skipped += skipped and expected != 'en'
+
+        for code in sorted(totals):
+            self.stdout.write(f"  {code}: {correct[code]}/{totals[code]} detected correctly")
+        self.stdout.write(f"  Non-English texts wrongly skipped: {wrongly_skipped}")
+        self._report(results)
+
+        if options['from_db']:
+            texts = list(
+                Issue.objects.order_by('-created_at')
+                .values_list('description', flat=True)[:options['from_db']]
+            )
+            self.stdout.write(f"\nRecent issues ({len(texts)} samples)")
+            self._report(self._run(texts, threshold))
+
+    def _run(self, texts, threshold):
+        detections = []
+        start = time.perf_counter()
+        for text in texts:
+            language, confidence = detect_language(text)
+            detections.append((language, language == 'en' and confidence >= threshold))
+        elapsed = time.perf_counter() - start
+        return {'detections': detections, 'elapsed': elapsed, 'count': len(texts)}
+
+    def _report(self, results):
+        count = results['count'] or 1
+        avoided = sum(1 for _, skipped in results['detections'] if skipped)
+        by_language = Counter(language for language, _ in results['detections'])
+        self.stdout.write(f"  Detected: {dict(by_language)}")
+        self.stdout.write(f"  LLM translation calls avoided: {avoided}/{results['count']} ({avoided / count:.1%})")
+        self.stdout.write(f"  Mean detection time: {results['elapsed'] / count * 1e6:.1f} us")
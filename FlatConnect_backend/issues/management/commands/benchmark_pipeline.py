@@ -0,0 +1,185 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from issues.llm_backends import FakeLLM, FakeLLMBackend, set_backend
+from issues.models import AgentAction, Issue, IssueCategory, Society
+from issues.pipeline import start_pipeline
+from issues.stats import percentile
+
+User = get_user_model()
+
+BENCHMARK_SOCIETY = "Benchmark Society"
+BENCHMARK_EMAIL = "benchmark@flatconnect.local"
+CATEGORIES = ['Plumbing', 'Electrical', 'Cleaning', 'Security']
+SYNTHETIC_ISSUES = [
+    ("Tap leaking", "Water leaking from the kitchen tap since morning"),
+    ("Lift stuck", "Lift in B wing is stuck between 3rd and 4th floor"),
+    ("Street light", "Street light near gate 2 is not working at night"),
+    ("Garbage", "Garbage has not been collected for three days, very bad smell"),
+    ("Sparks from meter", "Short circuit sparks from the meter box on ground floor"),
+    ("Guard absent", "Security guard was absent at the main gate last night"),
+    ("पानी का रिसाव", "बाथरूम में पानी का रिसाव हो रहा है"),
+    ("पाणी गळती", "बाथरूममध्ये पाणी गळत आहे, नळ दुरुस्त करा"),
+]
+# Each issue is finished once the last stage has logged its action
+FINAL_ACTION = 'prioritize'
+
+
+def create_synthetic_issues(count):
+    """Create count issues in the benchmark society, with its reporter and categories"""
+    society, _ = Society.objects.get_or_create(name=BENCHMARK_SOCIETY, defaults={'address': "Benchmark"})
+    reporter = User.objects.filter(email=BENCHMARK_EMAIL).first()
+    if reporter is None:
+        reporter = User.objects.create_user(email=BENCHMARK_EMAIL, password=None)
+    for name in CATEGORIES:
+        IssueCategory.objects.get_or_create(name=name)
+
+    return Issue.objects.bulk_create([
+        Issue(
+            society=society,
+            reporter=reporter,
+            title=SYNTHETIC_ISSUES[i % len(SYNTHETIC_ISSUES)][0],
+            description=f"{SYNTHETIC_ISSUES[i % len(SYNTHETIC_ISSUES)][1]} (#{i})",
+        )
+        for i in range(count)
+    ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Push synthetic issues through the agent pipeline and report throughput and stage latency. "
+        "Set LLM_RATE_LIMIT_ENABLED=False to measure without the provider rate limit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=50)
+        parser.add_argument('--mode', choices=['eager', 'worker'], default='eager',
+                            help="eager: run tasks in this process; worker: dispatch to running Celery workers")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Threads dispatching issues in eager mode")
+        parser.add_argument('--backend', choices=['fake', 'configured'], default='fake',
+                            help="eager mode only: in-process fake LLM, or settings.LLM_BACKEND "
+                                 "(workers always use their own LLM_BACKEND)")
+        parser.add_argument('--latency-ms', type=float, default=300.0, help="Fake LLM median latency")
+        parser.add_argument('--latency-sigma', type=float, default=0.5)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=600.0,
+                            help="worker mode: seconds to wait for the pipeline to finish")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic issues afterwards")
+
+    def handle(self, *args, **options):
+        if options['issues'] < 1:
+            raise CommandError("--issues must be positive")
+
+        issues = create_synthetic_issues(options['issues'])
+        issue_ids = [str(issue.id) for issue in issues]
+        self.stdout.write(f"Created {len(issue_ids)} synthetic issues, mode={options['mode']}")
+
+        try:
+            start = time.perf_counter()
+            if options['mode'] == 'eager':
+                completed = self._run_eager(issues, issue_ids, options)
+            else:
+                completed = self._run_worker(issues, issue_ids, options['timeout'])
+            elapsed = time.perf_counter() - start
+            self._report(issue_ids, completed, elapsed)
+        finally:
+            if options['mode'] == 'eager':
+                set_backend(None)
+                current_app.conf.update(CELERY_TASK_ALWAYS_EAGER=settings.CELERY_TASK_ALWAYS_EAGER)
+            if not options['keep']:
+                Issue.objects.filter(id__in=issue_ids).delete()
+
+    def _run_eager(self, issues, issue_ids, options):
+        if options['backend'] == 'fake':
+            set_backend(FakeLLMBackend(FakeLLM(
+                latency_ms=options['latency_ms'],
+                latency_sigma=options['latency_sigma'],
+                error_rate=options['error_rate'],
+                seed=options['seed'],
+            )))
+        # The app reads its config with the CELERY namespace, so the namespaced key is
+        # the one that wins; setting conf.task_always_eager would be ignored
+        current_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+
+        def run(issue):
+            try:
+                start_pipeline(issue)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(run, issues))
+        return self._completed(issue_ids)
+
+    def _run_worker(self, issues, issue_ids, timeout):
+        for issue in issues:
+            start_pipeline(issue)
+
+        deadline = time.monotonic() + timeout
+        completed = 0
+        while time.monotonic() < deadline:
+            completed = self._completed(issue_ids)
+            if completed >= len(issue_ids):
+                break
+            time.sleep(0.5)
+        else:
+            self.stdout.write(self.style.WARNING(f"Timed out with {completed}/{len(issue_ids)} issues finished"))
+        return completed
+
+    def _completed(self, issue_ids):
+        return AgentAction.objects.filter(issue_id__in=issue_ids, action=FINAL_ACTION).count()
+
+    def _report(self, issue_ids, completed, elapsed):
+        stage_times = defaultdict(lambda: defaultdict(list))
+        actions = AgentAction.objects.filter(issue_id__in=issue_ids).values_list(
+            'issue_id', 'agent_type', 'processing_time', 'llm_ms', 'db_ms', 'queue_wait_ms', 'prompt_tokens', 'completion_tokens'
+        )
+        issue_prompt_tokens = defaultdict(int)
+        issue_completion_tokens = defaultdict(int)
+        for issue_id, agent_type, processing_time, llm_ms, db_ms, queue_wait_ms, prompt_tokens, completion_tokens in actions:
+            issue_prompt_tokens[issue_id] += prompt_tokens or 0
+            issue_completion_tokens[issue_id] += completion_tokens or 0
+            times = stage_times[agent_type]
+            times['total'].append(processing_time * 1000)
+            for name, value in (('llm', llm_ms), ('db', db_ms), ('queue', queue_wait_ms)):
+                if value is not None:
+                    times[name].append(value)
+            times['tokens'].append((prompt_tokens or 0) + (completion_tokens or 0))
+
+        self.stdout.write(f"Completed:  {completed}/{len(issue_ids)} issues in {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {completed / elapsed:.2f} issues/s")
+        self.stdout.write("Stage latency (ms):")
+        for agent_type in sorted(stage_times):
+            values = stage_times[agent_type]['total']
+            self.stdout.write(
+                f"  {agent_type:<22} n={len(values):<5} p50={percentile(values, 50):8.1f} "
+                f"p95={percentile(values, 95):8.1f} p99={percentile(values, 99):8.1f}"
+            )
+        self.stdout.write("Stage breakdown (p50 ms, mean tokens):")
+        for agent_type in sorted(stage_times):
+            times = stage_times[agent_type]
+            tokens = times['tokens']
+            self.stdout.write(
+                f"  {agent_type:<22} llm={percentile(times['llm'], 50):8.1f} db={percentile(times['db'], 50):8.1f} "
+                f"queue={percentile(times['queue'], 50):8.1f} tokens={sum(tokens) / len(tokens):7.0f}"
+            )
+
+        costs = [
+            issue_prompt_tokens[issue_id] / 1000 * settings.LLM_PROMPT_COST_PER_1K
+            + issue_completion_tokens[issue_id] / 1000 * settings.LLM_COMPLETION_COST_PER_1K
+            for issue_id in issue_prompt_tokens
+        ]
+        totals = [issue_prompt_tokens[i] + issue_completion_tokens[i] for i in issue_prompt_tokens]
+        self.stdout.write(
+            f"Tokens per issue: p50={percentile(totals, 50):.0f} p95={percentile(totals, 95):.0f}; "
+            f"estimated cost per issue: p50=${percentile(costs, 50):.4f} p95=${percentile(costs, 95):.4f}"
+        )
@@ -0,0 +1,92 @@
+import time
+
+from celery import current_app
+from django.core.management.base import BaseCommand, CommandError
+
+from issues.models import Issue, PipelineRun
+from issues.pipeline import start_pipeline
+from issues.routing import LANE_BACKFILL, LANE_NORMAL, pipeline_lane
+from issues.stats import percentile
+
+from .benchmark_pipeline import create_synthetic_issues
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure end-to-end latency of new issues while a large backfill is queued. "
+        "Needs running Celery workers, e.g. one on agents_urgent,agents and one on maintenance; "
+        "--backfill-lane normal puts the backfill on the agents queue to show the starvation it causes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', type=int, default=500, help="Issues in the backfill")
+        parser.add_argument('--issues', type=int, default=20, help="New issues created while the backfill runs")
+        parser.add_argument('--interval', type=float, default=0.5, help="Seconds between new issues")
+        parser.add_argument('--backfill-lane', choices=[LANE_BACKFILL, LANE_NORMAL], default=LANE_BACKFILL)
+        parser.add_argument('--timeout', type=float, default=600.0,
+                            help="Seconds to wait for the new issues to finish")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic issues afterwards")
+
+    def handle(self, *args, **options):
+        if current_app.conf.task_always_eager:
+            raise CommandError("Queue isolation needs real workers; unset CELERY_TASK_ALWAYS_EAGER")
+
+        backfill = create_synthetic_issues(options['backfill'])
+        backfill_ids = [issue.id for issue in backfill]
+        new_ids = []
+        try:
+            start = time.perf_counter()
+            for issue in backfill:
+                start_pipeline(issue, lane=options['backfill_lane'])
+            self.stdout.write(
+                f"Queued {len(backfill)} backfill runs on lane={options['backfill_lane']} "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+
+            lanes = {}
+            for _ in range(options['issues']):
+                time.sleep(options['interval'])
+                issue = create_synthetic_issues(1)[0]
+                lanes[issue.id] = pipeline_lane(issue)
+                start_pipeline(issue)
+                new_ids.append(issue.id)
+
+            self._wait(new_ids, options['timeout'])
+            self._report(new_ids, lanes, backfill_ids)
+        finally:
+            if not options['keep']:
+                # Backfill stages still queued find their run gone and are skipped
+                Issue.objects.filter(id__in=backfill_ids + new_ids).delete()
+
+    def _wait(self, issue_ids, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            pending = PipelineRun.objects.filter(
+                issue_id__in=issue_ids, status__in=PipelineRun.ACTIVE_STATUSES
+            ).count()
+            if not pending:
+                return
+            time.sleep(0.5)
+        self.stdout.write(self.style.WARNING(f"Timed out with {pending} new issues unfinished"))
+
+    def _report(self, new_ids, lanes, backfill_ids):
+        latencies = {}
+        for issue_id, created_at, finished_at in PipelineRun.objects.filter(
+            issue_id__in=new_ids, finished_at__isnull=False
+        ).values_list('issue_id', 'created_at', 'finished_at'):
+            latencies.setdefault(lanes[issue_id], []).append((finished_at - created_at).total_seconds() * 1000)
+
+        backfill_done = PipelineRun.objects.filter(
+            issue_id__in=backfill_ids, finished_at__isnull=False
+        ).count()
+        self.stdout.write(f"Backfill finished meanwhile: {backfill_done}/{len(backfill_ids)}")
+        self.stdout.write("New issue latency, trigger to last stage (ms):")
+        for lane in sorted(latencies):
+            values = latencies[lane]
+            self.stdout.write(
+                f"  {lane:<8} n={len(values):<4} p50={percentile(values, 50):8.1f} "
+                f"p95={percentile(values, 95):8.1f} max={max(values):8.1f}"
+            )
+        unfinished = len(new_ids) - sum(len(values) for values in latencies.values())
+        if unfinished:
+            self.stdout.write(self.style.WARNING(f"  {unfinished} new issues did not finish"))
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from issues import runtime
+from issues.stats import percentile
+
+
+async def _stage(agent):
+    # The shape of a stage without its work: one hop to a worker thread, as for the LLM call
+    await asyncio.to_thread(lambda: agent.agent_type)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the fixed per-task cost of asyncio.run() with fresh agents against the "
+        "per-process runtime (persistent loop and agent singletons)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        def per_task():
+            for agent_class in runtime.PIPELINE_AGENTS:
+                asyncio.run(_stage(agent_class()))
+
+        def persistent():
+            for agent_class in runtime.PIPELINE_AGENTS:
+                runtime.run(_stage(runtime.get_agent(agent_class)))
+
+        runtime.start()
+        try:
+            for name, pipeline in (("asyncio.run + new agents", per_task), ("persistent runtime", persistent)):
+                timings = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    pipeline()
+                    timings.append((time.perf_counter() - start) * 1_000_000)
+                self.stdout.write(
+                    f"{name:<26} per 3-stage pipeline: p50={percentile(timings, 50):8.0f}us "
+                    f"p95={percentile(timings, 95):8.0f}us p99={percentile(timings, 99):8.0f}us"
+                )
+        finally:
+            runtime.shutdown()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from issues.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed image files that no IssueImage refers to (after the grace period)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        stats = collect_garbage(dry_run=options['dry_run'])
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(f"{verb} {stats['blobs']} blobs, {stats['bytes'] / 1024 / 1024:.1f} MB")
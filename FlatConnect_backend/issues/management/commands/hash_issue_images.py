@@ -0,0 +1,41 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from issues.models import IssueImage
+from issues.phash import BAND_FIELDS, dhash, link_duplicates, set_hash
+
+
+class Command(BaseCommand):
+    help = "Compute perceptual hashes of images processed before hashing existed, then link duplicate photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        pending = IssueImage.objects.filter(processing_status='ready', dhash__isnull=True).order_by('id')
+        hashed_ids = []
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for image in batch:
+                # The thumbnail is small to read and hashes like the original
+                try:
+                    with default_storage.open(image.renditions['thumb'], 'rb') as f, Image.open(f) as thumb:
+                        set_hash(image, dhash(thumb))
+                except Exception as e:
+                    self.stderr.write(f"Could not hash image {image.id}: {e}")
+                    continue
+                hashed_ids.append(image.id)
+            IssueImage.objects.bulk_update(batch, ['dhash', *BAND_FIELDS])
+        self.stdout.write(f"Hashed {len(hashed_ids)} images")
+
+        # Second pass, once every image has a hash, so earlier look-alikes are found
+        linked = 0
+        for start in range(0, len(hashed_ids), options['batch_size']):
+            ids = hashed_ids[start:start + options['batch_size']]
+            linked += link_duplicates(list(IssueImage.objects.filter(id__in=ids).select_related('issue')))
+        self.stdout.write(f"Linked {linked} images to earlier issues with a near-identical photo")
@@ -0,0 +1,93 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from issues.llm_backends import FakeLLM
+
+
+def make_handler(fake: FakeLLM, quiet: bool):
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self._send(404, {'error': {'message': 'Not found'}})
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                messages = payload['messages']
+            except (ValueError, KeyError):
+                self._send(400, {'error': {'message': 'Invalid request body'}})
+                return
+
+            latency, status = fake.sample()
+            time.sleep(latency)
+            if status == 429:
+                self._send(429, {'error': {'message': 'Rate limit reached'}}, {'Retry-After': '1'})
+                return
+            if status != 200:
+                self._send(status, {'error': {'message': 'Fake upstream error'}})
+                return
+
+            content = fake.respond(messages)
+            self._send(200, {
+                'object': 'chat.completion',
+                'model': payload.get('model', 'fake'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': fake.usage(messages, content),
+            })
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+    return FakeLLMHandler
+
+
+class Command(BaseCommand):
+    help = "Serve a deterministic OpenAI-compatible fake LLM for local benchmarks (use with HTTPLLMBackend)"
+
+    def add_arguments(self, parser):
+        defaults = settings.FAKE_LLM
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency-ms', type=float, default=defaults['latency_ms'],
+                            help="Median response latency")
+        parser.add_argument('--latency-sigma', type=float, default=defaults['latency_sigma'],
+                            help="Spread of the log-normal latency distribution")
+        parser.add_argument('--error-rate', type=float, default=defaults['error_rate'],
+                            help="Fraction of requests answered with HTTP 500")
+        parser.add_argument('--rate-limit-rate', type=float, default=defaults['rate_limit_rate'],
+                            help="Fraction of requests answered with HTTP 429")
+        parser.add_argument('--seed', type=int, default=defaults['seed'])
+        parser.add_argument('--quiet', action='store_true', help="Don't log each request")
+
+    def handle(self, *args, **options):
+        fake = FakeLLM(
+            latency_ms=options['latency_ms'],
+            latency_sigma=options['latency_sigma'],
+            error_rate=options['error_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            seed=options['seed'],
+        )
+        server = ThreadingHTTPServer((options['host'], options['port']), make_handler(fake, options['quiet']))
+        self.stdout.write(f"Fake LLM listening on http://{options['host']}:{options['port']}/v1/chat/completions")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,258 @@
+"""Serving of media files with HTTP caching, Range requests and lazy thumbnails.
+
+- Content-addressed files (renditions under issue_images/renditions/<digest>/)
+  never change, so they get a digest ETag and a year-long immutable
+  Cache-Control. Other files get an mtime/size ETag and MEDIA_CACHE_SECONDS.
+- If-None-Match answers 304. A single "bytes=" Range answers 206, which
+  lets mobile clients resume a large download. If-Range is honoured.
+- With MEDIA_OFFLOAD = 'x-accel' (nginx) or 'x-sendfile' (Apache,
+  lighttpd) Django only checks and sets headers, and the web server sends
+  the bytes.
+- ?size=N, for N in MEDIA_THUMBNAIL_SIZES, returns a WebP no larger than
+  N pixels. It is generated on first request and kept in a disk cache
+  bounded to MEDIA_THUMBNAIL_CACHE_MAX_BYTES, least recently used out first.
+- Uploaded originals can carry EXIF/GPS and are never served as they are.
+  Bytes go out only for files written without metadata: issue image
+  renditions and processed profile pictures. Thumbnails are re-encoded,
+  so they may be made from any image under THUMBNAIL_SOURCE_PREFIXES.
+  Rendition names contain the SHA-256 of the photo, so they cannot be
+  guessed.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+from .images import render
+IMMUTABLE_PREFIX = 'issue_images/renditions/'
+# Processed profile pictures (accounts/tasks.py): <user id>[_<suffix>].webp
+PROFILE_PICTURE_RE = re.compile(r'^profile_pictures/\d+(_\w+)?\.webp$')
+THUMBNAIL_SOURCE_PREFIXES = ('issue_images/', 'profile_pictures/')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+READ_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ThumbnailCache:
+    """Files named by key in one directory; total size kept under max_bytes by evicting the least recently used"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.webp")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        try:
+            # mtime doubles as last access time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, content: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _scan(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.webp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        return entries, total
+
+    def _evict(self):
+        # Other processes share the directory, so re-measure instead of trusting the running total
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+
+thumbnail_cache = ThumbnailCache(settings.MEDIA_THUMBNAIL_CACHE_DIR, settings.MEDIA_THUMBNAIL_CACHE_MAX_BYTES)
+
+
+def _validators(path: str, stat) -> Tuple[str, str]:
+    """(ETag, Cache-Control) for a file"""
+    if path.startswith(IMMUTABLE_PREFIX):
+        return f'"{hashlib.sha1(path.encode()).hexdigest()}"', IMMUTABLE_CACHE_CONTROL
+    return f'W/"{int(stat.st_mtime)}-{stat.st_size}"', f'public, max-age={settings.MEDIA_CACHE_SECONDS}'
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single byte range; None to send the whole file; raises ValueError if unsatisfiable"""
+    match = _range_re.match(header.strip())
+    if not match:
+        # Multiple ranges or other units: serving the whole file is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _read_range(full_path: str, start: int, length: int):
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _thumbnail(path: str, full_path: str, stat, size: int) -> str:
+    key = hashlib.sha1(f"{path}:{stat.st_mtime_ns}:{stat.st_size}:{size}".encode()).hexdigest()
+    cached = thumbnail_cache.get(key)
+    if cached:
+        return cached
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    try:
+        rendered = render(data, {'thumb': size}, settings.IMAGE_WEBP_QUALITY)
+    except Exception:
+        raise Http404("Not an image")
+    return thumbnail_cache.put(key, rendered['renditions']['thumb'])
+
+
+def _servable(path: str, thumbnail: bool) -> bool:
+    """Files that carry no metadata; anything an image can be re-encoded from for thumbnails"""
+    if thumbnail:
+        return path.startswith(THUMBNAIL_SOURCE_PREFIXES)
+    return path.startswith(IMMUTABLE_PREFIX) or bool(PROFILE_PICTURE_RE.match(path))
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match with weak comparison: a list of ETags or *"""
+    if not header:
+        return False
+    tags = parse_etags(header)
+    if '*' in tags:
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.removeprefix('W/') == opaque for tag in tags)
+
+
+def _offload(response: HttpResponse, path: str, full_path: str) -> HttpResponse:
+    if settings.MEDIA_OFFLOAD == 'x-accel':
+        response['X-Accel-Redirect'] = settings.MEDIA_OFFLOAD_PREFIX.rstrip('/') + '/' + path
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    path = path.lstrip('/')
+    size_param = request.GET.get('size')
+    if not _servable(path, thumbnail=size_param is not None):
+        raise Http404("Not found")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404("Not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Not found")
+    etag, cache_control = _validators(path, stat)
+
+    if size_param is not None:
+        try:
+            size = int(size_param)
+        except ValueError:
+            size = None
+        if size not in settings.MEDIA_THUMBNAIL_SIZES:
+            return HttpResponse(f"size must be one of {list(settings.MEDIA_THUMBNAIL_SIZES)}", status=400)
+        etag = f'{etag[:-1]}-{size}"'
+        if _etag_matches(request.headers.get('If-None-Match'), etag):
+            return _not_modified(etag, cache_control)
+        full_path = _thumbnail(path, full_path, stat, size)
+        path = os.path.relpath(full_path, settings.MEDIA_THUMBNAIL_CACHE_DIR)
+        stat = os.stat(full_path)
+        content_type = 'image/webp'
+        offload = False  # the cache directory is not under the offload location
+    else:
+        if _etag_matches(request.headers.get('If-None-Match'), etag):
+            return _not_modified(etag, cache_control)
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        offload = bool(settings.MEDIA_OFFLOAD)
+
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    if offload:
+        # The web server handles Range and sends the bytes
+        response = HttpResponse(content_type=content_type, headers=headers)
+        return _offload(response, path, full_path)
+
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{stat.st_size}'})
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206, content_type=content_type, headers=headers
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+    return response
+
+
+def _not_modified(etag: str, cache_control: str) -> HttpResponse:
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
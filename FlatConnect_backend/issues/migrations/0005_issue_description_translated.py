@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0004_convert_category_to_foreign_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='description_translated',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0006_agentaction_timing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='description_compact',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='agentaction',
+            name='llm_calls',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0009_pipelinerun_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['status', 'updated_at'], name='issue_status_updated_idx'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('issue_assigned', 'Issue Assigned'), ('issue_updated', 'Issue Updated'), ('issue_resolved', 'Issue Resolved'), ('comment_added', 'Comment Added'), ('issue_escalated', 'Issue Escalated'), ('system', 'System Notification')], default='system', max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:45
+
+import issues.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0011_issueimage_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='imageblob_gc_idx')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='issueimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=issues.storage.image_storage, upload_to='issue_images/'),
+        ),
+    ]
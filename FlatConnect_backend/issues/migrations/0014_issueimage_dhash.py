@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0013_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issueimage',
+            name='dhash',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='dhash_band0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='dhash_band1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='dhash_band2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='dhash_band3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='duplicate_of_issue',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicate_photo_images', to='issues.issue'),
+        ),
+        migrations.AddField(
+            model_name='issueimage',
+            name='duplicate_distance',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -51,6 +53,8 @@ class Issue(models.Model):
     society = models.ForeignKey(Society, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     description = models.TextField()
+    description_translated = models.TextField(blank=True)  # English text used by the agents
+    description_compact = models.TextField(blank=True)  # Token-bounded form of description_translated
     language = models.CharField(max_length=5, choices=LANGUAGE_CHOICES, default='en')  # Multilingual
     category = models.ForeignKey(IssueCategory, on_delete=models.SET_NULL, null=True, blank=True)
     priority = models.IntegerField(choices=PRIORITY_CHOICES, default=1)
@@ -70,17 +74,89 @@ class Issue(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Range scans for issues stuck in a status (monitoring_agent)
+            models.Index(fields=['status', 'updated_at'], name='issue_status_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def prompt_description(self):
+        """Description the agents put in LLM prompts: compact English text when available"""
+        return self.description_compact or self.description_translated or self.description
+
+
+class ImageBlob(models.Model):
+    """A file in the content-addressed image storage, shared by identical uploads (issues/storage.py)"""
+    digest = models.CharField(max_length=64, primary_key=True)  # SHA-256 of the content
+    name = models.CharField(max_length=255)  # storage name
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)  # IssueImage rows pointing at it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Garbage collection: unreferenced blobs past the grace period
+            models.Index(fields=['ref_count', 'updated_at'], name='imageblob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 
 class IssueImage(models.Model):
+    PROCESSING_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='issue_images/')
+    image = models.ImageField(upload_to='issue_images/', storage=image_storage, db_index=True)  # blobs are shared by name
     caption = models.CharField(max_length=255, blank=True, null=True)  # Optional
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # ✅ Filled in by image_analysis_agent (see issues/images.py)
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_CHOICES, default='pending')
+    width = models.PositiveIntegerField(null=True, blank=True)  # of the original, after EXIF rotation
+    height = models.PositiveIntegerField(null=True, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)  # rendition name -> storage path (WebP, no EXIF)
+
+    # ✅ Perceptual hash (see issues/phash.py): the 64-bit dHash, stored signed,
+    # and its four 16-bit bands, each indexed for the near-duplicate lookup
+    dhash = models.BigIntegerField(null=True, blank=True, db_index=True)
+    dhash_band0 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    dhash_band1 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    dhash_band2 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    dhash_band3 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    # Earlier issue in the same society with a near-identical photo
+    duplicate_of_issue = models.ForeignKey(Issue, on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='duplicate_photo_images')
+    duplicate_distance = models.PositiveSmallIntegerField(null=True, blank=True)  # Hamming distance to it
+
+
+class ChunkedUpload(models.Model):
+    """A resumable upload assembled from chunks before it becomes an IssueImage (issues/chunked.py)"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('finalizing', 'Finalizing'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # declared total, in bytes
+    sha256 = models.CharField(max_length=64)  # declared checksum of the whole file
+    offset = models.PositiveBigIntegerField(default=0)  # bytes received so far
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    image = models.ForeignKey(IssueImage, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 
 class IssueComment(models.Model):
     issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='comments')
@@ -99,7 +175,61 @@ class AgentAction(models.Model):
     output_data = models.JSONField()
     confidence_score = models.FloatField(null=True, blank=True)
     processing_time = models.FloatField()  # in seconds
+    # Breakdown of processing_time (milliseconds) and LLM token usage for the stage
+    llm_ms = models.FloatField(null=True, blank=True)
+    db_ms = models.FloatField(null=True, blank=True)
+    queue_wait_ms = models.FloatField(null=True, blank=True)  # from dispatch to task start
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    llm_calls = models.JSONField(default=list, blank=True)  # per-request purpose, latency and tokens
+    # Set when the action happens, not when the buffered row is written
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+class PipelineRun(models.Model):
+    """One trigger of the agent pipeline for an issue; at most one is active per issue"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='pipeline_runs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    current_stage = models.CharField(max_length=50, blank=True)
+    error = models.TextField(blank=True)
+    # Checkpoints: stages finished by this run and their agent outputs; a
+    # re-trigger after a failure resumes from the first stage not listed here
+    completed_stages = models.JSONField(default=list, blank=True)
+    stage_outputs = models.JSONField(default=dict, blank=True)
+    # Renewed whenever a stage starts; an expired lease frees the issue for a new run
+    lease_expires_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Latest run per issue, for progress polling
+            models.Index(fields=['issue', '-created_at'], name='pipelinerun_issue_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['issue'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_pipeline_run',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.issue_id} - {self.status}"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
 
 
 class Notification(models.Model):
@@ -109,6 +239,7 @@ class Notification(models.Model):
         ('issue_updated', 'Issue Updated'),
         ('issue_resolved', 'Issue Resolved'),
         ('comment_added', 'Comment Added'),
+        ('issue_escalated', 'Issue Escalated'),
         ('system', 'System Notification'),
     ]
     
@@ -0,0 +1,128 @@
+"""Perceptual hashes of issue images and lookup of near-identical photos.
+
+Residents describe the same broken pipe in different words but often
+photograph it the same way. Each image gets a 64-bit difference hash (dHash)
+while it is rendered. Recompression and resizing flip only a few of its bits;
+crops shift the grid and move it much further, so only lightly cropped
+re-uploads of the same photo land within the default radius of 10.
+
+Lookup is multi-index hashing: the hash is split into HASH_BANDS indexed
+16-bit bands. Two hashes at most r bits apart differ by at most r // HASH_BANDS
+bits on at least one band, so an indexed IN over every band value within that
+radius returns every candidate and only those candidates are compared bit by
+bit.
+"""
+from datetime import timedelta
+from itertools import combinations
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from .models import IssueImage
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+HASH_BANDS = 4
+BAND_BITS = HASH_BITS // HASH_BANDS
+BAND_FIELDS = [f'dhash_band{i}' for i in range(HASH_BANDS)]
+# Largest supported distance: 3 flipped bits per band is already 697 values per band
+MAX_DISTANCE = HASH_BANDS * 4 - 1
+
+
+def dhash(image: Image.Image) -> int:
+    """Unsigned 64-bit hash: one bit per horizontally adjacent pixel pair of a 9x8 grayscale copy"""
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = small.load()
+    value = 0
+    for y in range(HASH_SIZE):
+        for x in range(HASH_SIZE):
+            value = (value << 1) | (pixels[x, y] > pixels[x + 1, y])
+    return value
+
+
+def to_signed(value: int) -> int:
+    """Unsigned hash as stored in a BigIntegerField"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def bands(value: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * i)) & mask for i in range(HASH_BANDS)]
+
+
+def band_neighbours(band: int, radius: int) -> List[int]:
+    """Every band value at most radius bits away from band"""
+    values = []
+    for flips in range(radius + 1):
+        for bits in combinations(range(BAND_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            values.append(band ^ mask)
+    return values
+
+
+def set_hash(image: IssueImage, value: Optional[int]):
+    """Store an unsigned hash (or None) and its bands on the image, unsaved"""
+    image.dhash = None if value is None else to_signed(value)
+    for field, band in zip(BAND_FIELDS, bands(value) if value is not None else [None] * HASH_BANDS):
+        setattr(image, field, band)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(to_unsigned(a) ^ to_unsigned(b)).count('1')
+
+
+def find_similar(image: IssueImage, max_distance: Optional[int] = None,
+                 window_days: Optional[int] = None) -> List[Tuple[IssueImage, int]]:
+    """Images of other recent issues in the same society within max_distance, nearest first"""
+    if image.dhash is None:
+        return []
+    if max_distance is None:
+        max_distance = settings.IMAGE_DUPLICATE_MAX_DISTANCE
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f'max_distance must be between 0 and {MAX_DISTANCE}, got {max_distance}')
+    if window_days is None:
+        window_days = settings.IMAGE_DUPLICATE_WINDOW_DAYS
+
+    value = to_unsigned(image.dhash)
+    band_radius = max_distance // HASH_BANDS
+    any_band = Q()
+    for field, band in zip(BAND_FIELDS, bands(value)):
+        any_band |= Q(**{f'{field}__in': band_neighbours(band, band_radius)})
+    candidates = IssueImage.objects.filter(
+        any_band,
+        issue__society_id=image.issue.society_id,
+        issue__created_at__gte=timezone.now() - timedelta(days=window_days),
+    ).exclude(issue_id=image.issue_id).only('id', 'issue_id', 'dhash', 'uploaded_at')
+
+    matches = []
+    for candidate in candidates:
+        distance = hamming(value, candidate.dhash)
+        if distance <= max_distance:
+            matches.append((candidate, distance))
+    matches.sort(key=lambda match: match[1])
+    return matches
+
+
+def link_duplicates(images: List[IssueImage]) -> int:
+    """Point each hashed image at the issue of its nearest earlier look-alike; returns the number linked"""
+    linked = []
+    for image in images:
+        # Only earlier images, so two new look-alikes never point at each other
+        earlier = [(match, distance) for match, distance in find_similar(image) if match.uploaded_at < image.uploaded_at]
+        if earlier:
+            match, distance = earlier[0]
+            image.duplicate_of_issue_id = match.issue_id
+            image.duplicate_distance = distance
+            linked.append(image)
+    if linked:
+        IssueImage.objects.bulk_update(linked, ['duplicate_of_issue', 'duplicate_distance'])
+    return len(linked)
@@ -0,0 +1,166 @@
+"""Idempotent, resumable runs of the agent pipeline.
+
+start_pipeline() records a PipelineRun before queueing the first stage. A
+partial unique constraint allows one queued/running run per issue, so a
+second trigger (double click, client retry, concurrent request) gets the
+existing run back instead of starting another pipeline. Every stage claims
+the run before doing any work, which renews its lease; a stage whose run is
+no longer active does nothing, so a run that was replaced after its lease
+expired cannot race the new one.
+
+Each finished stage is checkpointed on the run with its output. Triggering
+an issue whose last run failed starts a new run with those checkpoints and
+queues the first stage without one, so e.g. a priority failure does not
+repeat the enhancement and translation calls of intake. The failed run is
+never reactivated: stages still in flight for it keep finding it inactive.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import Issue, PipelineRun
+from .routing import pipeline_lane
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['intake', 'categorization', 'priority']
+# SQLite answers concurrent writers with "database is locked" rather than
+# waiting for the unique constraint; retry that many times before giving up
+CREATE_ATTEMPTS = 5
+
+
+class PipelineQueueError(Exception):
+    """The first stage could not be handed to the broker"""
+
+
+def _lease_deadline():
+    return timezone.now() + timedelta(seconds=settings.PIPELINE_RUN_LEASE_SECONDS)
+
+
+def _active(run_id):
+    return PipelineRun.objects.filter(id=run_id, status__in=PipelineRun.ACTIVE_STATUSES)
+
+
+def active_run(issue_id) -> Optional[PipelineRun]:
+    return PipelineRun.objects.filter(issue_id=issue_id, status__in=PipelineRun.ACTIVE_STATUSES).first()
+
+
+def latest_run(issue_id) -> Optional[PipelineRun]:
+    return PipelineRun.objects.filter(issue_id=issue_id).first()
+
+
+def next_stage(run: PipelineRun) -> Optional[str]:
+    return next((stage for stage in STAGES if stage not in run.completed_stages), None)
+
+
+def _resume_failed_run(issue: Issue) -> Optional[PipelineRun]:
+    """New run with the checkpoints of the latest run if it failed part-way; None when there is nothing to resume"""
+    run = latest_run(issue.id)
+    if run is None or run.status != 'failed' or not run.completed_stages or next_stage(run) is None:
+        return None
+    return PipelineRun.objects.create(
+        issue=issue,
+        lease_expires_at=_lease_deadline(),
+        completed_stages=run.completed_stages,
+        stage_outputs=run.stage_outputs,
+    )
+
+
+def start_pipeline(issue: Issue, lane: Optional[str] = None) -> Tuple[PipelineRun, bool]:
+    """Queue the pipeline for an issue unless a run is already active.
+
+    lane defaults to routing.pipeline_lane(issue). Returns (run, started). Raises PipelineQueueError if the
+    task cannot be queued; the run is marked failed first so the next trigger can try again.
+    """
+    existing = active_run(issue.id)
+    if existing is not None:
+        if existing.lease_expires_at > timezone.now():
+            return existing, False
+        logger.warning(f"Pipeline run {existing.id} for issue {issue.id} lost its lease")
+        finish_run(existing.id, error="Lease expired")
+
+    for attempt in range(CREATE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                run = _resume_failed_run(issue) or PipelineRun.objects.create(
+                    issue=issue, lease_expires_at=_lease_deadline()
+                )
+            break
+        except (IntegrityError, OperationalError) as e:
+            # A concurrent trigger created the active run first, or (SQLite) holds the write lock
+            existing = active_run(issue.id)
+            if existing is not None:
+                return existing, False
+            if isinstance(e, IntegrityError) or attempt + 1 == CREATE_ATTEMPTS:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+    stage = next_stage(run)
+    if run.completed_stages:
+        logger.info(f"Resuming pipeline run {run.id} for issue {issue.id} at {stage}")
+
+    # Imported here because the tasks import this module
+    from .tasks import STAGE_TASKS
+    try:
+        STAGE_TASKS[stage].delay(str(issue.id), enqueued_at=time.time(), run_id=run.id,
+                                 lane=lane or pipeline_lane(issue))
+    except Exception as e:
+        finish_run(run.id, error=f"Could not queue pipeline: {e}")
+        raise PipelineQueueError(str(e)) from e
+    # Eager mode has already run the whole pipeline by now
+    run.refresh_from_db()
+    return run, True
+
+
+def claim_stage(run_id: int, stage: str) -> Optional[PipelineRun]:
+    """Mark the run as running the stage and renew its lease; None if it is no longer active"""
+    now = timezone.now()
+    claimed = _active(run_id).update(
+        status='running',
+        current_stage=stage,
+        lease_expires_at=now + timedelta(seconds=settings.PIPELINE_RUN_LEASE_SECONDS),
+        updated_at=now,
+    )
+    if not claimed:
+        return None
+    return PipelineRun.objects.only('completed_stages', 'stage_outputs').get(id=run_id)
+
+
+def complete_stage(run_id: int, stage: str, output: Dict[str, Any]):
+    """Checkpoint a finished stage and its output"""
+    with transaction.atomic():
+        run = PipelineRun.objects.select_for_update().get(id=run_id)
+        if stage not in run.completed_stages:
+            run.completed_stages.append(stage)
+        run.stage_outputs[stage] = output
+        run.save(update_fields=['completed_stages', 'stage_outputs', 'updated_at'])
+
+
+def finish_run(run_id: int, error: Optional[str] = None):
+    now = timezone.now()
+    _active(run_id).update(
+        status='failed' if error else 'succeeded',
+        error=error or '',
+        finished_at=now,
+        updated_at=now,
+    )
+
+
+def run_status(run: PipelineRun) -> Dict[str, Any]:
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "stage": run.current_stage,
+        "completed_stages": run.completed_stages,
+        "progress": f"{len(run.completed_stages)}/{len(STAGES)}",
+        "outputs": run.stage_outputs,
+        "error": run.error,
+        "created_at": run.created_at,
+        "updated_at": run.updated_at,
+        "finished_at": run.finished_at,
+    }
@@ -0,0 +1,210 @@
+"""Cross-worker rate limiting for LLM calls.
+
+Token buckets for requests/minute and tokens/minute, a concurrency cap and a
+shared backoff window, all kept in a small SQLite file so every Celery worker
+on the host draws from the same budget without needing Redis. Each acquire
+runs in a single BEGIN IMMEDIATE transaction, which serializes workers.
+
+Waiters register with a priority; a waiter only proceeds when nobody with a
+higher priority is waiting, so later pipeline stages finish before new
+issues start.
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, priority INTEGER NOT NULL, heartbeat REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+"""
+
+# Longest single sleep between attempts, so new higher-priority waiters are noticed
+MAX_POLL_INTERVAL = 0.5
+
+
+def full_jitter_delay(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(self, path: str, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 waiter_ttl: float = 10.0, lease_ttl: float = 120.0):
+        self.path = str(path)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.waiter_ttl = waiter_ttl
+        self.lease_ttl = lease_ttl
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _refill(self, conn, name: str, capacity: float, now: float) -> float:
+        row = conn.execute("SELECT level, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            level = capacity
+        else:
+            level, updated_at = row
+            level = min(capacity, level + (now - updated_at) * capacity / 60.0)
+        conn.execute(
+            "INSERT INTO buckets (name, level, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated_at = excluded.updated_at",
+            (name, level, now),
+        )
+        return level
+
+    def try_acquire(self, waiter_id: str, tokens: int, priority: int = 0) -> Tuple[Optional[str], float]:
+        """One attempt: returns (lease id, 0) when granted, else (None, seconds to wait)"""
+        # A single request larger than the whole budget would otherwise never fit
+        tokens = min(tokens, self.tokens_per_minute)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - self.waiter_ttl,))
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT INTO waiters (id, priority, heartbeat) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (waiter_id, priority, now),
+            )
+
+            row = conn.execute("SELECT value FROM state WHERE key = 'blocked_until'").fetchone()
+            if row and row[0] > now:
+                return None, row[0] - now
+
+            higher = conn.execute("SELECT 1 FROM waiters WHERE priority > ? LIMIT 1", (priority,)).fetchone()
+            if higher:
+                return None, MAX_POLL_INTERVAL / 2
+
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            if in_flight >= self.max_concurrency:
+                return None, MAX_POLL_INTERVAL / 2
+
+            requests = self._refill(conn, 'requests', self.requests_per_minute, now)
+            budget = self._refill(conn, 'tokens', self.tokens_per_minute, now)
+            wait = max(
+                (1 - requests) * 60.0 / self.requests_per_minute,
+                (tokens - budget) * 60.0 / self.tokens_per_minute,
+            )
+            if wait > 0:
+                return None, wait
+
+            conn.execute("UPDATE buckets SET level = level - 1 WHERE name = 'requests'")
+            conn.execute("UPDATE buckets SET level = level - ? WHERE name = 'tokens'", (tokens,))
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            lease_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases (id, expires_at) VALUES (?, ?)", (lease_id, now + self.lease_ttl))
+            return lease_id, 0.0
+
+    def _next_sleep(self, wait: float) -> float:
+        # Jitter keeps workers that were blocked together from waking together
+        return min(wait, MAX_POLL_INTERVAL) * random.uniform(0.8, 1.2)
+
+    def acquire(self, tokens: int, priority: int = 0) -> str:
+        waiter_id = uuid.uuid4().hex
+        while True:
+            lease_id, wait = self.try_acquire(waiter_id, tokens, priority)
+            if lease_id:
+                return lease_id
+            time.sleep(self._next_sleep(wait))
+
+    async def acquire_async(self, tokens: int, priority: int = 0) -> str:
+        waiter_id = uuid.uuid4().hex
+        while True:
+            # BEGIN IMMEDIATE can wait on other workers; keep that off the shared event loop
+            lease_id, wait = await asyncio.to_thread(self.try_acquire, waiter_id, tokens, priority)
+            if lease_id:
+                return lease_id
+            await asyncio.sleep(self._next_sleep(wait))
+
+    def release(self, lease_id: str, used_tokens: Optional[int] = None, estimated_tokens: Optional[int] = None):
+        """Free the concurrency slot and settle the token estimate against actual usage"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+            if used_tokens is not None and estimated_tokens is not None:
+                # Refunds are capped by the bucket size; overruns may push the level negative
+                conn.execute(
+                    "UPDATE buckets SET level = MIN(?, level + ?) WHERE name = 'tokens'",
+                    (self.tokens_per_minute, estimated_tokens - used_tokens),
+                )
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff after a 429, shared by every worker"""
+        delay = full_jitter_delay(attempt, self.backoff_base, self.backoff_max)
+        if retry_after:
+            delay = max(delay, retry_after)
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO state (key, value) VALUES ('blocked_until', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (time.time() + delay,),
+        )
+        return delay
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> Optional[RateLimiter]:
+    """Process-wide limiter built from settings, or None when rate limiting is disabled"""
+    global _limiter
+    if not settings.LLM_RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    path=settings.LLM_RATE_LIMIT_DB,
+                    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    backoff_base=settings.LLM_BACKOFF_BASE,
+                    backoff_max=settings.LLM_BACKOFF_MAX,
+                )
+    return _limiter
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    return status == 429 or type(error).__name__ == 'RateLimitError'
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
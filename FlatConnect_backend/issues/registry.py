@@ -0,0 +1,102 @@
+"""Process-wide, in-memory registry of issue categories.
+
+Resolves free-text category names (LLM output, classifier labels) to
+IssueCategory ids without a query per issue. Exact normalized matches are
+tried first, then singular/plural variants, containment and finally fuzzy
+matching. The cache is invalidated by IssueCategory save/delete signals in
+this process and expires after CATEGORY_REGISTRY_TTL seconds so other
+processes pick up changes too.
+"""
+import difflib
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+
+from .models import IssueCategory
+
+# Minimum difflib similarity ratio for a fuzzy match
+FUZZY_CUTOFF = 0.75
+
+_non_alnum_re = re.compile(r'[^a-z0-9]+')
+
+
+class Category(NamedTuple):
+    id: int
+    name: str
+
+
+def normalize(name: str) -> str:
+    return _non_alnum_re.sub(' ', (name or '').lower()).strip()
+
+
+def _singular(key: str) -> str:
+    return key[:-1] if key.endswith('s') and not key.endswith('ss') else key
+
+
+class CategorySnapshot:
+    """Immutable view of the categories at load time; all lookups are in memory"""
+
+    def __init__(self, categories: List[Category]):
+        self.categories = categories
+        self.names = [category.name for category in categories]
+        self._by_key: Dict[str, Category] = {}
+        for category in categories:
+            key = normalize(category.name)
+            self._by_key.setdefault(key, category)
+            self._by_key.setdefault(_singular(key), category)
+        # Longest first so "water tank" wins over "water" in containment matches
+        self._keys = sorted(self._by_key, key=len, reverse=True)
+
+    def __bool__(self):
+        return bool(self.categories)
+
+    def resolve(self, text: str) -> Optional[Category]:
+        key = normalize(text)
+        if not key:
+            return None
+
+        category = self._by_key.get(key) or self._by_key.get(_singular(key))
+        if category:
+            return category
+
+        # "Plumbing issue" or "category: plumbing" style answers
+        padded = f" {key} "
+        for known in self._keys:
+            if f" {known} " in padded:
+                return self._by_key[known]
+
+        close = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        return self._by_key[close[0]] if close else None
+
+
+class CategoryRegistry:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[CategorySnapshot] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> CategorySnapshot:
+        """Current categories, loading them from the database when stale (sync context only)"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at >= self.ttl_seconds:
+                categories = [Category(*row) for row in IssueCategory.objects.order_by('id').values_list('id', 'name')]
+                self._snapshot = CategorySnapshot(categories)
+                self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def resolve(self, text: str) -> Optional[Category]:
+        return self.snapshot().resolve(text)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+category_registry = CategoryRegistry(settings.CATEGORY_REGISTRY_TTL)
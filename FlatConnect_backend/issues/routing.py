@@ -0,0 +1,60 @@
+"""Celery queue routing for the issues tasks.
+
+Pipeline stages go to the agents queue, or to agents_urgent when the issue
+looks high/critical from local keywords (the priority agent has not run
+yet). Notifications and maintenance/backfill work have queues of their own,
+so a large backfill or slow image analysis cannot delay the intake of a new
+complaint. The lane is passed along as a task kwarg so every stage of a run
+stays on the queue its first stage was routed to.
+"""
+from . import heuristics
+
+QUEUE_AGENTS = 'agents'
+QUEUE_AGENTS_URGENT = 'agents_urgent'
+QUEUE_NOTIFICATIONS = 'notifications'
+QUEUE_MAINTENANCE = 'maintenance'
+
+LANE_NORMAL = 'normal'
+LANE_URGENT = 'urgent'
+LANE_BACKFILL = 'backfill'
+
+LANE_QUEUES = {
+    LANE_NORMAL: QUEUE_AGENTS,
+    LANE_URGENT: QUEUE_AGENTS_URGENT,
+    LANE_BACKFILL: QUEUE_MAINTENANCE,
+}
+
+PIPELINE_TASKS = {
+    'issues.tasks.intake_agent',
+    'issues.tasks.categorization_agent',
+    'issues.tasks.priority_agent',
+}
+
+TASK_QUEUES = {
+    'issues.tasks.communication_agent': QUEUE_NOTIFICATIONS,
+    'issues.tasks.image_analysis_agent': QUEUE_MAINTENANCE,
+    'issues.tasks.monitoring_agent': QUEUE_MAINTENANCE,
+    'issues.tasks.backfill_pipelines': QUEUE_MAINTENANCE,
+    'issues.tasks.collect_image_blobs': QUEUE_MAINTENANCE,
+    'issues.tasks.expire_chunked_uploads': QUEUE_MAINTENANCE,
+    'accounts.tasks.process_profile_picture': QUEUE_MAINTENANCE,
+    'accounts.tasks.import_residents_csv': QUEUE_MAINTENANCE,
+    'accounts.tasks.send_email_outbox': QUEUE_NOTIFICATIONS,
+}
+
+# Issue.PRIORITY_CHOICES: 3 = High, 4 = Critical
+URGENT_PRIORITY = 3
+
+
+def pipeline_lane(issue) -> str:
+    """Preliminary lane for a new run, before the priority agent has scored the issue"""
+    priority, _ = heuristics.prioritize(f"{issue.title}\n{issue.description}")
+    return LANE_URGENT if max(priority, issue.priority or 0) >= URGENT_PRIORITY else LANE_NORMAL
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """CELERY_TASK_ROUTES entry; None falls through to the default queue"""
+    if name in PIPELINE_TASKS:
+        return {'queue': LANE_QUEUES.get((kwargs or {}).get('lane'), QUEUE_AGENTS)}
+    queue = TASK_QUEUES.get(name)
+    return {'queue': queue} if queue else None
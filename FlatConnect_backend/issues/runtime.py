@@ -0,0 +1,82 @@
+"""Long-lived event loop, LLM client and agent instances for worker processes.
+
+asyncio.run() builds and tears down an event loop (and its default thread
+pool, used by asyncio.to_thread for the LLM call) for every task, and new
+agent instances meant nothing survived between tasks. Tasks now run their
+coroutine with run(), which reuses one loop per thread, and take agents from
+get_agent(). Celery's worker_process_init/shutdown signals (see tasks.py)
+call start() and shutdown(); outside a worker (eager mode, benchmarks) the
+same objects are created lazily on first use.
+
+Agents keep no per-issue state (stage timing lives in a context variable),
+so one instance per class is shared by every task in the process.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Type, TypeVar
+
+from .agents import BaseAgent, CategorizationAgent, IntakeAgent, PriorityAgent
+from .llm_backends import close_backend, get_backend
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_AGENTS = (IntakeAgent, CategorizationAgent, PriorityAgent)
+
+AgentT = TypeVar('AgentT', bound=BaseAgent)
+
+_local = threading.local()
+_loops: List[asyncio.AbstractEventLoop] = []
+_agents: Dict[type, BaseAgent] = {}
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """This thread's persistent event loop"""
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+        with _lock:
+            _loops.append(loop)
+    return loop
+
+
+def run(coro):
+    """Drop-in for asyncio.run() that keeps the loop (and its executor) for the next task"""
+    return get_loop().run_until_complete(coro)
+
+
+def get_agent(agent_class: Type[AgentT]) -> AgentT:
+    agent = _agents.get(agent_class)
+    if agent is None:
+        with _lock:
+            agent = _agents.setdefault(agent_class, agent_class())
+    return agent
+
+
+def start():
+    """Build the loop, LLM client and agents before the process takes its first task"""
+    get_loop()
+    get_backend()
+    for agent_class in PIPELINE_AGENTS:
+        get_agent(agent_class)
+
+
+def shutdown():
+    """Close every loop created in this process and drop the client and agents"""
+    with _lock:
+        loops = list(_loops)
+        _loops.clear()
+        _agents.clear()
+    for loop in loops:
+        if loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        except Exception as e:
+            logger.error(f"Error shutting down event loop: {e}")
+        finally:
+            loop.close()
+    close_backend()
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Issue, IssueImage, IssueComment, IssueCategory, Society, Notification
+from .images import rendition_urls
+from .uploads import attach_images
 
 User = get_user_model()
 
@@ -12,9 +14,21 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class IssueImageSerializer(serializers.ModelSerializer):
+    # Originals can carry EXIF/GPS, so only the processed WebP renditions are
+    # exposed; they are null until image_analysis_agent has run
+    image = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = IssueImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'renditions', 'width', 'height', 'processing_status',
+                  'duplicate_of_issue', 'duplicate_distance', 'uploaded_at']
+
+    def get_renditions(self, obj):
+        return rendition_urls(obj)
+
+    def get_image(self, obj):
+        return rendition_urls(obj).get('full')
 
 
 class IssueCommentSerializer(serializers.ModelSerializer):
@@ -63,10 +77,7 @@ class IssueSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         image_files = validated_data.pop('image_files', [])
         issue = Issue.objects.create(**validated_data)
-
-        for img in image_files:
-            IssueImage.objects.create(issue=issue, image=img)
-
+        issue.uploaded_images = attach_images(issue, image_files)
         return issue
 
     def update(self, instance, validated_data):
@@ -74,10 +85,7 @@ class IssueSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
-
-        for img in image_files:
-            IssueImage.objects.create(issue=instance, image=img)
-
+        instance.uploaded_images = attach_images(instance, image_files)
         return instance
 
 
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .blobs import add_references, remove_references
+from .models import IssueCategory, IssueImage
+from .registry import category_registry
+
+@receiver(post_save, sender=IssueCategory)
+@receiver(post_delete, sender=IssueCategory)
+def invalidate_category_registry(sender, **kwargs):
+    """Drop the cached categories so the next lookup reloads them"""
+    category_registry.invalidate()
+
+@receiver(post_save, sender=IssueImage)
+def reference_image_blob(sender, instance, created, **kwargs):
+    """Count the new row against its content-addressed file (bulk inserts call add_references themselves)"""
+    if created:
+        add_references([instance.image.name])
+
+@receiver(post_delete, sender=IssueImage)
+def release_image_blob(sender, instance, **kwargs):
+    remove_references([instance.image.name])
@@ -0,0 +1,64 @@
+"""Content-addressed storage for issue images.
+
+Every upload is hashed (SHA-256) by reading it once, before anything is
+written. A file whose digest is already stored is not written again: the
+upload resolves to the existing issue_images/blobs/<aa>/<digest>.<ext> name.
+The same photo attached to several duplicate complaints therefore takes the
+disk space, and the write, of one. issues/blobs.py counts IssueImage
+references per blob and garbage-collects the unreferenced ones.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'issue_images/blobs'
+
+
+def digest_file(content):
+    """Return (sha256 hex digest, size) of a Django File, reading it chunk by chunk"""
+    sha = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks():
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def blob_name(digest: str, extension: str) -> str:
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest}{extension.lower()}"
+
+
+def blob_digest(name: str):
+    """Digest of a content-addressed name; None for files stored before this storage existed"""
+    if not name or not name.startswith(BLOB_PREFIX + '/'):
+        return None
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        # Imported here: the models import this module for the field's storage
+        from .blobs import register_blob
+
+        digest, size = digest_file(content)
+        target, created = register_blob(digest, blob_name(digest, os.path.splitext(name)[1]), size)
+        if not created and self.exists(target):
+            return target
+
+        stored = super()._save(target, content)
+        if stored != target:
+            # The file was already there: a concurrent upload of the same content, or
+            # one GC is about to delete with its old row. Same bytes, so rewrite it.
+            os.replace(self.path(stored), self.path(target))
+        return target
+
+
+_image_storage = ContentAddressedStorage()
+
+
+def image_storage():
+    """Storage callable for IssueImage.image (keeps migrations free of the instance)"""
+    return _image_storage
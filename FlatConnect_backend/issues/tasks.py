@@ -1,26 +1,112 @@
 from celery import shared_task
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown
 from .agents import IntakeAgent, CategorizationAgent, PriorityAgent
-import asyncio
+from .audit import get_audit_buffer
+from .blobs import collect_garbage
+from .chunked import expire_uploads
+from .escalation import escalate_stale_issues
+from .images import process_issue_images, shutdown_executor
+from . import pipeline, runtime
+from .routing import LANE_BACKFILL
+import time
 from django.utils import timezone
 from .models import Issue, Notification
 
+# Each stage queues the next one only after its coroutine has finished, so
+# the chain also works with CELERY_TASK_ALWAYS_EAGER (no nested event loops).
+# enqueued_at (epoch seconds) lets each stage record how long it sat in the queue.
+# run_id is the PipelineRun started by pipeline.start_pipeline; without it the
+# stages run unguarded and without checkpoints (e.g. when queued by hand).
+# lane picks the queue for every stage of the run (see routing.py).
+
+def _run_stage(agent_class, stage: str, issue_id: str, enqueued_at: float = None, run_id: int = None, lane: str = None):
+    run = None
+    if run_id is not None:
+        run = pipeline.claim_stage(run_id, stage)
+        if run is None:
+            return {"status": "skipped", "message": f"Pipeline run {run_id} is no longer active"}
+
+    if run is not None and stage in run.completed_stages:
+        # Redelivered or resumed: reuse the checkpoint instead of calling the LLM again
+        result = {"status": "success", "data": run.stage_outputs.get(stage), "checkpoint": True}
+    else:
+        agent = runtime.get_agent(agent_class)
+        result = runtime.run(agent.process_issue(issue_id, enqueued_at))
+        if result["status"] == "success" and run is not None:
+            pipeline.complete_stage(run_id, stage, result["data"])
+
+    if result["status"] != "success":
+        get_audit_buffer().flush()
+        if run is not None:
+            pipeline.finish_run(run_id, error=result.get("message") or f"{stage} failed")
+        return result
+
+    position = pipeline.STAGES.index(stage)
+    if position + 1 < len(pipeline.STAGES):
+        STAGE_TASKS[pipeline.STAGES[position + 1]].delay(issue_id, enqueued_at=time.time(), run_id=run_id, lane=lane)
+    else:
+        # End of the pipeline: write this issue's buffered audit trail
+        get_audit_buffer().flush()
+        if run is not None:
+            pipeline.finish_run(run_id)
+    return result
+
 @shared_task
-def intake_agent(issue_id: str):
+def intake_agent(issue_id: str, enqueued_at: float = None, run_id: int = None, lane: str = None):
     """Process issue through intake agent (enhance description, language processing)"""
-    agent = IntakeAgent()
-    return asyncio.run(agent.process_issue(issue_id))
+    return _run_stage(IntakeAgent, "intake", issue_id, enqueued_at, run_id, lane)
 
 @shared_task
-def categorization_agent(issue_id: str):
+def categorization_agent(issue_id: str, enqueued_at: float = None, run_id: int = None, lane: str = None):
     """Process issue through categorization agent"""
-    agent = CategorizationAgent()
-    return asyncio.run(agent.process_issue(issue_id))
+    return _run_stage(CategorizationAgent, "categorization", issue_id, enqueued_at, run_id, lane)
 
 @shared_task
-def priority_agent(issue_id: str):
+def priority_agent(issue_id: str, enqueued_at: float = None, run_id: int = None, lane: str = None):
     """Process issue through priority agent"""
-    agent = PriorityAgent()
-    return asyncio.run(agent.process_issue(issue_id))
+    return _run_stage(PriorityAgent, "priority", issue_id, enqueued_at, run_id, lane)
+
+STAGE_TASKS = {
+    "intake": intake_agent,
+    "categorization": categorization_agent,
+    "priority": priority_agent,
+}
+
+@shared_task
+def backfill_pipelines(limit: int = 500):
+    """Run the pipeline for issues that never went through it, on the maintenance lane"""
+    started = 0
+    for issue in Issue.objects.filter(pipeline_runs__isnull=True).order_by('created_at')[:limit]:
+        _, created = pipeline.start_pipeline(issue, lane=LANE_BACKFILL)
+        started += created
+    return started
+
+@shared_task
+def collect_image_blobs():
+    """Delete image files no IssueImage refers to any more (scheduled daily)"""
+    return collect_garbage()
+
+@shared_task
+def expire_chunked_uploads():
+    """Delete chunked uploads abandoned for longer than CHUNKED_UPLOAD_TTL_HOURS"""
+    return expire_uploads()
+
+@task_postrun.connect
+def flush_due_agent_actions(**kwargs):
+    """Honour AUDIT_FLUSH_SECONDS even when no further actions arrive"""
+    get_audit_buffer().flush_if_due()
+
+@worker_process_init.connect
+def start_agent_runtime(**kwargs):
+    """One event loop, LLM client and set of agents per worker process (see runtime.py)"""
+    runtime.start()
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    """Write buffered audit rows, then close the agent runtime and the image pool"""
+    get_audit_buffer().flush()
+    runtime.shutdown()
+    shutdown_executor()
 
 # ✅ Removed assignment_agent for manual assignment
 
@@ -48,10 +134,10 @@ def communication_agent(issue_id: str, action: str):
 
 @shared_task
 def image_analysis_agent(issue_id: str):
-    """Analyze uploaded images (optional AI processing)"""
-    print(f"Analyzing images for issue {issue_id}...")
+    """Render WebP renditions of the issue's new images and strip their EXIF (see images.py)"""
+    return process_issue_images(issue_id)
 
 @shared_task
 def monitoring_agent():
-    """Monitor issues for escalation and follow-up"""
-    print("Monitoring issues for escalation...")
\ No newline at end of file
+    """Escalate issues stuck past their SLA (scheduled by celery beat, see CELERY_BEAT_SCHEDULE)"""
+    return escalate_stale_issues()
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Token estimation and prompt compaction for agent prompts.
+
+The estimate is deliberately simple (no tokenizer dependency): about four
+ASCII characters per token, and one token per non-ASCII character, which is
+the right order of magnitude for Devanagari. It is used to reserve
+rate-limit budget and to keep descriptions under PROMPT_DESCRIPTION_MAX_TOKENS.
+"""
+import math
+import re
+from typing import Dict, List
+
+MESSAGE_OVERHEAD_TOKENS = 4
+ELLIPSIS = " … "
+
+_sentence_re = re.compile(r'(?<=[.!?।])\s+|\n+')
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars))
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens at a word boundary"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+    return cut.rsplit(' ', 1)[0] if ' ' in cut else cut
+
+
+def compact_text(text: str, max_tokens: int) -> str:
+    """Fit text into max_tokens, keeping the opening sentences and the last one.
+
+    Complaints usually state the problem first and the location or urgency at
+    the end, so the middle is what gets dropped.
+    """
+    text = (text or '').strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [sentence.strip() for sentence in _sentence_re.split(text) if sentence.strip()]
+    if len(sentences) < 2:
+        return _truncate(text, max_tokens)
+
+    tail = _truncate(sentences[-1], max_tokens // 4)
+    budget = max_tokens - estimate_tokens(tail) - estimate_tokens(ELLIPSIS)
+    head = []
+    for sentence in sentences[:-1]:
+        cost = estimate_tokens(sentence) + 1
+        if cost > budget:
+            if not head:
+                head.append(_truncate(sentence, budget))
+            break
+        head.append(sentence)
+        budget -= cost
+    return ' '.join(head) + ELLIPSIS + tail
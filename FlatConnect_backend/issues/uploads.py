@@ -0,0 +1,72 @@
+"""The one path by which uploaded files become IssueImage rows.
+
+Files are stored in parallel on a small thread pool (hashing for the
+content-addressed storage is the bulk of the work; a temporary upload is
+then moved into place, not copied). The rows are inserted with a single
+bulk_create and image_analysis_agent renders their renditions in the
+background, so the caller can answer immediately with pending placeholders.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .blobs import add_references
+from .models import Issue, IssueImage
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_UPLOAD_THREADS, thread_name_prefix='uploads')
+    return _executor
+
+
+def _store(upload) -> str:
+    field = IssueImage._meta.get_field('image')
+    try:
+        return field.storage.save(field.generate_filename(None, upload.name), upload, max_length=field.max_length)
+    finally:
+        # The storage registers blobs from this pool thread's own connection
+        close_old_connections()
+
+
+def attach_images(issue: Issue, uploads) -> List[IssueImage]:
+    """Store uploads and create their IssueImage rows; files that fail are logged and skipped"""
+    if not uploads:
+        return []
+
+    futures = [(upload, _get_executor().submit(_store, upload)) for upload in uploads]
+    names = []
+    for upload, future in futures:
+        try:
+            names.append(future.result())
+        except Exception as e:
+            logger.error(f"Error uploading image {upload.name}: {e}")
+
+    # bulk_create skips the post_save signal that counts blob references
+    images = IssueImage.objects.bulk_create([IssueImage(issue=issue, image=name) for name in names])
+    add_references(names)
+
+    if images:
+        transaction.on_commit(lambda: _queue_processing(issue.id))
+    return images
+
+
+def _queue_processing(issue_id):
+    # Imported here: the tasks import the serializers' modules
+    from .tasks import image_analysis_agent
+    try:
+        image_analysis_agent.delay(str(issue_id))
+    except Exception as e:
+        logger.error(f"Could not queue image processing for issue {issue_id}: {e}")
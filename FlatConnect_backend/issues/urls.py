@@ -14,4 +14,8 @@ urlpatterns = [
     path('<uuid:issue_id>/status/', views.update_issue_status, name='update_status'),
     path('create/', views.create_issue, name='create_issue'),
     path('<uuid:issue_id>/start/', views.start_multiagent_pipeline, name='start_pipeline'),
+    path('<uuid:issue_id>/pipeline/', views.pipeline_status, name='pipeline_status'),
+    path('<uuid:issue_id>/uploads/', views.init_upload, name='init_upload'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload, name='chunked_upload'),
+    path('uploads/<uuid:upload_id>/finalize/', views.finalize_upload, name='finalize_upload'),
 ]
\ No newline at end of file
@@ -5,14 +5,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.utils import timezone
-from .models import Issue, Society, IssueCategory, IssueImage, Notification
+from .models import Issue, Society, IssueCategory, Notification, ChunkedUpload
 from .serializers import IssueSerializer, IssueImageSerializer, NotificationSerializer
-from .tasks import intake_agent
+from .pipeline import PipelineQueueError, start_pipeline, run_status, latest_run
+from .chunked import UploadError, start_upload, append_chunk, finalize_upload as finalize_chunked_upload, upload_status
 import asyncio
+import logging
 from django.contrib.auth import get_user_model
 from accounts.models import UserProfile
+from accounts.permissions import IsManager, IsWorker, WORKER_ROLES
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 # ✅ List Issues for User or Staff
 @api_view(['GET'])
@@ -52,7 +56,11 @@ def issue_categories(request):
 @permission_classes([IsAuthenticated])
 def create_issue(request):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    data = request.data.copy()
+    # ✅ No request.data.copy(): it deep-copies every uploaded file
+    image_files = request.FILES.getlist('image_files')
+    data = {key: value for key, value in request.data.items() if key != 'image_files'}
+    if image_files:
+        data['image_files'] = image_files
     
     # Default Society (for now)
     society, _ = Society.objects.get_or_create(name="Default Society", defaults={'address': "Default Address"})
@@ -60,32 +68,20 @@ def create_issue(request):
 
     serializer = IssueSerializer(data=data)
     if serializer.is_valid():
-        # Set the reporter to the current user
+        # Set the reporter to the current user; images are stored once, by the serializer,
+        # and their renditions are rendered in the background
         issue = serializer.save(reporter=request.user)
-
-        # Handle Images with better error handling
-        images = request.FILES.getlist('image_files')  # Changed from 'images' to 'image_files'
-        uploaded_images = []
-        
-        for img in images:
-            try:
-                image_obj = IssueImage.objects.create(issue=issue, image=img)
-                uploaded_images.append({
-                    'id': image_obj.id,
-                    'filename': img.name,
-                    'url': image_obj.image.url
-                })
-                print(f"Image uploaded successfully: {img.name}")
-            except Exception as e:
-                print(f"Error uploading image {img.name}: {str(e)}")
-                # Continue with other images even if one fails
+        uploaded_images = IssueImageSerializer(issue.uploaded_images, many=True).data
 
         # Start pipeline (optional)
         try:
-            intake_agent.delay(str(issue.id))
+            start_pipeline(issue)
             agent_status = "started"
-        except Exception:
+        except PipelineQueueError:
             agent_status = "failed - celery not running"
+        except Exception as e:
+            logger.error(f"Could not start the pipeline for issue {issue.id}: {e}")
+            agent_status = "failed - could not start pipeline"
 
         return Response({
             "status": "Issue created",
@@ -98,16 +94,11 @@ def create_issue(request):
 
 # ✅ Manual Task Assignment (Admin Only)
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsManager])
 def assign_issue(request, issue_id):
     """Assign issue to a worker (Admin/Secretary only)"""
     issue = get_object_or_404(Issue, id=issue_id)
     
-    # Check if user has permission to assign (admin, secretary, or superuser)
-    if not (request.user.is_superuser or request.user.is_staff or 
-            hasattr(request.user, 'profile') and request.user.profile.role in ['admin', 'secretary']):
-        return Response({"error": "Only admins and secretaries can assign issues"}, status=403)
-    
     worker_id = request.data.get('worker_id')
     new_status = request.data.get('status', 'assigned')  # Default to 'assigned'
     
@@ -118,18 +109,16 @@ def assign_issue(request, issue_id):
     if new_status not in dict(Issue.STATUS_CHOICES):
         return Response({"error": "Invalid status"}, status=400)
     
-    # Get the worker and validate they are actually a worker
-    try:
-        worker = User.objects.get(id=worker_id)
-        worker_profile = UserProfile.objects.get(user=worker)
-        
-        if worker_profile.role not in ['worker', 'admin']:
-            return Response({"error": "Can only assign to workers or admins"}, status=400)
-            
-    except User.DoesNotExist:
+    # ✅ Worker and profile in one joined query
+    worker = User.objects.select_related('profile').filter(id=worker_id).first()
+    if worker is None:
         return Response({"error": "Worker not found"}, status=404)
+    try:
+        worker_profile = worker.profile
     except UserProfile.DoesNotExist:
         return Response({"error": "Worker profile not found"}, status=404)
+    if worker_profile.role not in WORKER_ROLES:
+        return Response({"error": "Can only assign to workers or admins"}, status=400)
     
     # Update issue
     issue.assigned_to = worker
@@ -167,16 +156,11 @@ def assign_issue(request, issue_id):
 
 # ✅ Get Available Workers (Admin Only)
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsManager])
 def get_available_workers(request):
     """Get list of available workers for assignment"""
-    # Check if user has permission
-    if not (request.user.is_superuser or request.user.is_staff or 
-            hasattr(request.user, 'profile') and request.user.profile.role in ['admin', 'secretary']):
-        return Response({"error": "Only admins and secretaries can view workers"}, status=403)
-    
     # Get all workers and admins
-    workers = UserProfile.objects.filter(role__in=['worker', 'admin']).select_related('user')
+    workers = UserProfile.objects.filter(role__in=WORKER_ROLES).select_related('user')
     
     workers_data = []
     for profile in workers:
@@ -239,13 +223,9 @@ def my_issues(request):
 
 # ✅ Worker's Assigned Issues - Get issues assigned to current worker
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsWorker])
 def worker_assigned_issues(request):
     """Get only the issues assigned to the currently logged-in worker"""
-    # Check if user is a worker
-    if not hasattr(request.user, 'profile') or request.user.profile.role not in ['worker', 'admin']:
-        return Response({"error": "Only workers can access this endpoint"}, status=403)
-    
     issues = Issue.objects.filter(assigned_to=request.user).order_by('-created_at')
     serializer = IssueSerializer(issues, many=True)
     return Response({
@@ -260,7 +240,95 @@ def start_multiagent_pipeline(request, issue_id):
     issue = get_object_or_404(Issue, id=issue_id, reporter=request.user)
     
     try:
-        intake_agent.delay(str(issue.id))
-        return Response({"status": "Pipeline triggered", "issue_id": str(issue.id)})
+        run, created = start_pipeline(issue)
+    except PipelineQueueError as e:
+        return Response({"status": "Pipeline failed - celery not running", "error": str(e)})
     except Exception as e:
-        return Response({"status": "Pipeline failed - celery not running", "error": str(e)})
\ No newline at end of file
+        logger.error(f"Could not start the pipeline for issue {issue.id}: {e}")
+        return Response({"status": "Pipeline failed", "error": str(e)}, status=503)
+
+    # ✅ Duplicate triggers are no-ops that report the run already in progress;
+    # a run that failed part-way resumes from its first unfinished stage
+    return Response({
+        "status": "Pipeline triggered" if created else "Pipeline already running",
+        "issue_id": str(issue.id),
+        "pipeline_run": run_status(run)
+    })
+
+# ✅ Pipeline progress (cheap to poll: one indexed query, no issue serialization)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def pipeline_status(request, issue_id):
+    """Latest pipeline run for an issue with its completed stages (reporter or staff only)"""
+    issues = Issue.objects.filter(id=issue_id)
+    if not request.user.is_staff:
+        issues = issues.filter(reporter=request.user)
+    if not issues.exists():
+        return Response({"error": "Issue not found"}, status=404)
+
+    run = latest_run(issue_id)
+    if run is None:
+        return Response({"error": "Pipeline has not been started for this issue"}, status=404)
+    return Response(run_status(run))
+
+def _upload_error(error):
+    body = {"error": str(error)}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return Response(body, status=error.status_code)
+
+# ✅ Resumable chunked upload: init
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def init_upload(request, issue_id):
+    """Declare a file (filename, size, sha256) to be uploaded in chunks for an issue"""
+    issue = get_object_or_404(Issue, id=issue_id)
+    if not (request.user.is_staff or issue.reporter_id == request.user.id):
+        return Response({"error": "Only the reporter can add photos to this issue"}, status=403)
+
+    try:
+        size = int(request.data.get('size', 0))
+    except (TypeError, ValueError):
+        return Response({"error": "size must be an integer"}, status=400)
+    try:
+        upload = start_upload(request.user, issue, request.data.get('filename') or 'upload',
+                              size, request.data.get('sha256') or '')
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(upload_status(upload), status=status.HTTP_201_CREATED)
+
+# ✅ Resumable chunked upload: current offset (GET) / append a chunk (PATCH)
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAuthenticated])
+def chunked_upload(request, upload_id):
+    """PATCH the raw chunk bytes with an Upload-Offset header (and optionally Upload-Checksum, its SHA-256)"""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    if request.method == 'GET':
+        return Response(upload_status(upload))
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({"error": "Upload-Offset header is required", "offset": upload.offset}, status=400)
+    try:
+        # Read straight from the request stream, never request.body, so memory stays bounded
+        upload.offset = append_chunk(upload, offset, request.stream, length, request.headers.get('Upload-Checksum'))
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(upload_status(upload))
+
+# ✅ Resumable chunked upload: finalize into an IssueImage
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload.objects.select_related('issue', 'image'), id=upload_id, user=request.user)
+    try:
+        image = finalize_chunked_upload(upload)
+    except UploadError as e:
+        return _upload_error(e)
+    return Response({
+        "status": "Image attached",
+        "issue_id": str(upload.issue_id),
+        "image": IssueImageSerializer(image).data
+    }, status=status.HTTP_201_CREATED)